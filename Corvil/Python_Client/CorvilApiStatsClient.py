@@ -125,6 +125,26 @@ Usage: CorvilApiStatsClient.py [<options>] <command> <args> ...
     --businessHours <businessHours> Business period named period name
     -g <grouping>, --grouping       Grouping Tag Types comma separated, e.g Client,Gateway,Sessions
                                     For Session grouping use keyword "Sessions" and it should be last grouping specified
+    --mps-per-request <count>       Split the request into requests of at most <count>
+                                    measurement points each, run in parallel and merged (stats)
+    --stats-per-request <count>     Split the request into requests of at most <count>
+                                    statistics each, run in parallel and merged (stats)
+    --points-per-request <count>    Split a time range (-s, -e) into windows of at most <count>
+                                    points at the -R resolution, run in parallel and stitched
+                                    back together. Without -R the windows are requested at a
+                                    5 minute resolution instead of the one the server would
+                                    pick for the whole range. When a window spans more than a
+                                    day, a shorter window at either end is merged into its
+                                    neighbour (stats)
+    --hosts <hosts>                 Comma-separated list of additional CNEs or CMCs, e.g.
+                                    "cne2,cne3:5101", polled for the same measurement points
+                                    and statistics; rows are prefixed with the host (live-stats)
+    --mps-per-session <count>       Split the measurement points into live sessions of at
+                                    most <count> each, polled in parallel (live-stats)
+    --workers <count>               Number of parallel requests for --mps-per-request,
+                                    --stats-per-request and --points-per-request. Default
+                                    value: 4. Also caps the number of live stats sessions
+                                    polled at once, which by default is all of them
 
   Time Formats:
     YYYY-MM-DD HH:MM:SS
@@ -136,6 +156,11 @@ Usage: CorvilApiStatsClient.py [<options>] <command> <args> ...
 import re
 from optparse import OptionParser
 import logging
+import asyncio
+import bisect
+import concurrent.futures
+import copy
+import threading
 import suds
 from suds import plugin
 from suds import client
@@ -144,6 +169,7 @@ import time
 import csv
 import datetime
 import itertools
+import array
 import math
 
 from LensDataModel import LensDataResponse
@@ -157,6 +183,8 @@ except:
 
 VERSION='3.2.0.202206301037-GA+273102'
 
+LIVE_HISTORY_SIZE = 8
+
 logging.basicConfig(level=logging.INFO)
 
 
@@ -194,6 +222,94 @@ def str_to_list_of_ints(s):
         return list(map(convert, s.split(' ')))
     return []
 
+def chunk_list(l, size):
+    if not size:
+        return [l]
+    return [l[i:i + size] for i in range(0, len(l), size)]
+
+def split_time_range(startTime, endTime, bucketSize, buckets):
+    """
+    Split a time range into windows of the given number of buckets, with
+    every window edge inside the range on a bucket boundary
+    """
+    windowSize = bucketSize * buckets
+    windows = []
+    windowStart = startTime
+    windowEnd = (startTime // bucketSize) * bucketSize + windowSize
+    while windowEnd < endTime:
+        windows.append((windowStart, windowEnd))
+        windowStart = windowEnd
+        windowEnd += windowSize
+    windows.append((windowStart, endTime))
+    return windows
+
+def merge_short_windows(windows, shortest):
+    """
+    Merge every window no longer than shortest into its neighbour, so that
+    a split range has no short window at either end
+    """
+    merged = []
+    for window in windows:
+        if merged and (merged[-1][1] - merged[-1][0] <= shortest or window[1] - window[0] <= shortest):
+            merged[-1] = (merged[-1][0], window[1])
+        else:
+            merged.append(window)
+    return merged
+
+def series_tokens(s):
+    return s.split(' ') if s else []
+
+def parse_number(s):
+    try:
+        return int(s)
+    except ValueError:
+        return float(s)
+
+def stitch_numbers(values):
+    return [parse_number(value) for value in values if value not in (None, '-')]
+
+def stitch_min(values):
+    numbers = stitch_numbers(values)
+    return str(min(numbers)) if numbers else '-'
+
+def stitch_max(values):
+    numbers = stitch_numbers(values)
+    return str(max(numbers)) if numbers else '-'
+
+def stitch_total(values, weights=None):
+    """Sum of the values, each counted weight times when weights are given"""
+    if weights is None:
+        weights = [1] * len(values)
+    pairs = [(parse_number(value), weight) for value, weight in zip(values, weights)
+             if value not in (None, '-')]
+    if not pairs:
+        return '-'
+    return format_number(sum(value * weight for value, weight in pairs),
+                         all(isinstance(value, int) for value, weight in pairs))
+
+def stitch_mean(values, weights):
+    pairs = [(parse_number(value), weight) for value, weight in zip(values, weights)
+             if value not in (None, '-') and weight]
+    if not pairs:
+        return stitch_last(values)
+    mean = sum(value * weight for value, weight in pairs) / float(sum(weight for value, weight in pairs))
+    return format_number(mean, all(isinstance(value, int) for value, weight in pairs))
+
+def format_number(value, integral):
+    """
+    Format a combined value the way the server does: integer inputs give an
+    integer, rounded half up, and anything else is left as a float
+    """
+    if integral:
+        return str(int(math.floor(value + 0.5)))
+    return str(value)
+
+def stitch_last(values):
+    for value in reversed(values):
+        if value not in (None, '-'):
+            return value
+    return values[-1] if values else None
+
 def bool_to_str(b):
     return 'true' if b else 'false'
 
@@ -244,6 +360,8 @@ def column_header(type, unit=None):
 
 class MethodNotAvailableException(Exception):
     pass
+class StatsStitchException(Exception):
+    pass
 class SudsParameterPlugin(suds.plugin.MessagePlugin):
     """
     Suds plugin to specify extra method parameters This is necessary to allow
@@ -304,6 +422,43 @@ class NonEmptyRowCsvWriter(object):
             self.writer.writerow(['','',''])
 
 
+class PrefixedCsvWriter(object):
+    """
+    Writes rows with a leading column, e.g. the host, so that the rows of
+    several live stats sessions can share one output
+    """
+    def __init__(self, writer, prefix, header='#host'):
+        self.writer = writer
+        self.prefix = prefix
+        self.header = header
+
+    def writerow(self, row):
+        if row and str(row[0]).startswith('#'):
+            self.writer.writerow([self.header, str(row[0])[1:]] + list(row[1:]))
+        elif row:
+            self.writer.writerow([self.prefix] + list(row))
+        else:
+            self.writer.writerow(row)
+
+
+class UniqueHeaderCsvWriter(object):
+    """
+    Writes each distinct header row only once, so that live stats sessions
+    sharing one output write one header per set of columns
+    """
+    def __init__(self, writer):
+        self.writer = writer
+        self.headers = set()
+
+    def writerow(self, row):
+        if row and str(row[0]).startswith('#'):
+            header = tuple(str(column) for column in row)
+            if header in self.headers:
+                return
+            self.headers.add(header)
+        self.writer.writerow(row)
+
+
 class SummaryResponse(object):
     def __init__(self):
         self.filter = None
@@ -782,6 +937,20 @@ class StatsResponse(object):
                "measurementPoints=%s)" % (
                    self.startTime, self.endTime, list_to_str(self.measurementPoints))
 
+    def merge(self, other):
+        """
+        Merge in the response to a request for other measurement points or
+        other stats over the same time range
+        """
+        measurementPoints = dict((mp.name, mp) for mp in self.measurementPoints)
+        for measurementPoint in other.measurementPoints:
+            if measurementPoint.name in measurementPoints:
+                measurementPoints[measurementPoint.name].merge(measurementPoint)
+            else:
+                self.measurementPoints.append(measurementPoint)
+                measurementPoints[measurementPoint.name] = measurementPoint
+        return self
+
     def toCsv(self, output):
         if self._toCsvSummary(output):
             output.writerow([])
@@ -936,10 +1105,12 @@ class StatsResponse(object):
             TimeSeriesConfigurableStatistic,
             TimeSeriesDistributionConfigurableStatistic))
         all_stats = lambda mp : itertools.chain(mp.stats, mp.configurableStats)
+        mpStats = [list(filter(type_filter, all_stats(measurementPoint)))
+                   for measurementPoint in self.measurementPoints]
         columns = []
         timeSeriesColumns = []
-        for measurementPoint in self.measurementPoints:
-            for stat in filter(type_filter, all_stats(measurementPoint)):
+        for stats in mpStats:
+            for stat in stats:
                 for column in stat.summaryColumns:
                     if column not in columns:
                         columns.append(column)
@@ -950,17 +1121,17 @@ class StatsResponse(object):
         if columns:
             output.writerow(['#summary results for time series data'])
             output.writerow(['#measurement point'] + columns)
-            for measurementPoint in self.measurementPoints:
+            for measurementPoint, stats in zip(self.measurementPoints, mpStats):
+                """ the first stat listing a column supplies its value """
+                summaryStats = dict()
+                for stat in stats:
+                    for column in stat.summaryColumns:
+                        summaryStats.setdefault(column, stat)
                 row = [measurementPoint.name]
                 for column in columns:
-                    stats = list(filter(type_filter, all_stats(measurementPoint)))
-                    if stats:
-                        for stat in stats:
-                            if column in stat.summaryColumns:
-                                row.append(stat.summaryValues[column])
-                                break
-                        else:
-                            row.append('')
+                    stat = summaryStats.get(column)
+                    if stat is not None:
+                        row.append(stat.summaryValues[column])
                     else:
                         row.append('')
                 
@@ -971,79 +1142,82 @@ class StatsResponse(object):
             output.writerow(['#measurement point', 'start time',
                              'start timestamp (ms)', 'end time',
                              'end timestamp (ms)'] + timeSeriesColumns)
-            
-            responseStartTimes = None
-            responseEndTimes = None
 
-            for measurementPoint in self.measurementPoints:
+            gridIndex = None
+            gridRows = None
+
+            for measurementPoint, stats in zip(self.measurementPoints, mpStats):
+                if gridRows is None and timeSeriesColumns:
+                    """ the first stat with any start times fixes the bucket grid
+                        for the whole response """
+                    for stat in stats:
+                        if stat.startTimes:
+                            gridIndex, gridRows = self._timeSeriesGrid(stat)
+                            break
+                if not gridRows:
+                    continue
+
+                """ the first stat with non-empty values for a column supplies it """
+                valueStats = dict()
+                for stat in stats:
+                    for column, values in stat.timeSeriesValues.items():
+                        if values:
+                            valueStats.setdefault(column, stat)
+
+                blank = [''] * len(gridRows)
+                positions = dict()
                 timeSeriesValues = []
                 for column in timeSeriesColumns:
-                    stats = list(filter(type_filter, all_stats(measurementPoint)))
-                    if stats:
-                        for stat in stats:
-                            """ we can use even one starttime/endtime pair to get the 
-                                bucket size, the extrapolate out the number of buckets from
-                                the start and end time of the request
-                                
-                                WE ONLY NEED TO DO THIS ONCE PER RESPONSE hence the 'responseStartTimes' check
-                                """
-                            if stat.startTimes and len(stat.startTimes) > 0 and responseStartTimes == None:
-                                responseStartTimes = []
-                                responseEndTimes = []
-                                bucketSize = stat.endTimes[0] - stat.startTimes[0]
-                                """ self.endTime/startTime are the response end and start times """
-                                buckets = int((self.endTime - self.startTime) / bucketSize)
-                                
-                                """ now given we have the number of buckets & the bucketsize, populate our
-                                    response start and end times, starting with the RESPONSE start time.
-                                    this will ensure we don't miss out on gaps at the start of the data """
-                                bucketTime = self.startTime
-                                for bucket in range(0,buckets):
-                                    responseStartTimes.append(bucketTime)
-                                    bucketTime = bucketTime + bucketSize
-                                    responseEndTimes.append(bucketTime)
-
-                        """ Now, having created the complete start and end times above, actually
-                            handle the stats here """
-                        for stat in stats:
-                            if column in stat.timeSeriesValues:
-                                values = stat.timeSeriesValues[column]
-                                if values:
-                                    """ We're assuming if there are values that there are corresponding start and end
-                                        times, and therefore that the responseStartTimes and responseEndTimes have been
-                                        populated above."""
-                                    allValues = [''] * len(responseStartTimes)
-                                    allIndex = 0
-                                    for statIndex, startTime in enumerate(stat.startTimes):
-                                        """ we want to iterate over the ACTUAL start times listed for the 
-                                            stat, and check if and where they exist in the responseStartTimes array,
-                                            and set the appropriate value on the tempValues array from this position
-                                            on the 'values' array (which may have gaps)"""
-                                        try:
-                                            allIndex = responseStartTimes.index(startTime, allIndex)
-                                            allValues[allIndex] = values[statIndex]
-                                        except ValueError:
-                                            pass
-
-                                    timeSeriesValues.append(allValues)
-                                    break
-                        else:
-                            timeSeriesValues.append(itertools.repeat(''))
-                    else:
-                        timeSeriesValues.append(itertools.repeat(''))
-
-                if responseStartTimes and responseEndTimes:
-
-                    for items in zip(responseStartTimes, responseEndTimes, *timeSeriesValues):
-                        start, end = items[:2]
-                        items = list(items[2:])
-                        output.writerow([measurementPoint.name,
-                                         time_to_str(start), start,
-                                         time_to_str(end), end] + items)
+                    stat = valueStats.get(column)
+                    if stat is None:
+                        timeSeriesValues.append(blank)
+                        continue
+                    if id(stat) not in positions:
+                        positions[id(stat)] = self._alignToGrid(gridIndex, stat.startTimes)
+                    values = stat.timeSeriesValues[column]
+                    allValues = list(blank)
+                    for statIndex, allIndex in positions[id(stat)]:
+                        allValues[allIndex] = values[statIndex]
+                    timeSeriesValues.append(allValues)
+
+                for gridRow, items in zip(gridRows, zip(*timeSeriesValues)):
+                    output.writerow([measurementPoint.name] + gridRow + list(items))
 
             return True
         return False
 
+    def _timeSeriesGrid(self, stat):
+        """
+        Build the bucket grid covering the whole response from the bucket
+        size of one stat, so gaps at the start of the data are kept. Returns
+        a dict of bucket start time to bucket index and the formatted
+        start/end columns of each bucket.
+        """
+        bucketSize = stat.endTimes[0] - stat.startTimes[0]
+        buckets = int((self.endTime - self.startTime) / bucketSize)
+        edges = [self.startTime + bucket * bucketSize for bucket in range(buckets + 1)]
+        edgeStrs = [time_to_str(edge) for edge in edges]
+        gridIndex = dict((edges[bucket], bucket) for bucket in range(buckets))
+        gridRows = [[edgeStrs[bucket], edges[bucket], edgeStrs[bucket + 1], edges[bucket + 1]]
+                    for bucket in range(buckets)]
+        return gridIndex, gridRows
+
+    @staticmethod
+    def _alignToGrid(gridIndex, startTimes):
+        """
+        Map each of a stat's start times to its bucket in the grid, returning
+        (stat index, bucket index) pairs. Start times that are not on the grid,
+        or that fall before the previous match, are dropped.
+        """
+        positions = []
+        allIndex = 0
+        for statIndex, startTime in enumerate(startTimes):
+            bucket = gridIndex.get(startTime)
+            if bucket is not None and bucket >= allIndex:
+                positions.append((statIndex, bucket))
+                allIndex = bucket
+        return positions
+
     def _toCsvTimeSeriesEventData(self, output):
         type_filter = lambda x : isinstance(x, TimeSeriesEventData)
         columns = []
@@ -1622,6 +1796,9 @@ class MeasurementPoint(object):
         self.statsDict = None
         self.configurableStats = None
         self.configurableStatsDict = None
+        # response attribute each stat came from, to keep response order on merge
+        self.statAttributes = None
+        self.configurableStatAttributes = None
 
     def fromResponse(self, response, percentiles):
         self.name = response._name
@@ -1629,6 +1806,8 @@ class MeasurementPoint(object):
         self.statsDict = dict()
         self.configurableStats = []
         self.configurableStatsDict = dict()
+        self.statAttributes = []
+        self.configurableStatAttributes = []
         for attribute in dir(response):
             stat = getattr(response, attribute)
             statObject = None
@@ -1654,6 +1833,7 @@ class MeasurementPoint(object):
                         class_ = subStat.__class__.__name__
                         if class_ == 'TimeSeriesEventData':
                             self.stats.append(TimeSeriesEventData().fromResponse(subStat))
+                            self.statAttributes.append(attribute)
                 elif attribute in ['configurableStatCount',
                                    'configurableStatMinMeanMax',
                                    'configurableStatTotal',
@@ -1669,12 +1849,14 @@ class MeasurementPoint(object):
                                 configurableStat,))
                         if confStatObject:
                             self.configurableStats.append(confStatObject)
+                            self.configurableStatAttributes.append(attribute)
                             header=column_header(confStatObject.name, getattr(confStatObject, 'unit', None))
                             self.configurableStatsDict[header] = confStatObject
                 else:
                     print("Not a stat: %s" % (stat,))
                 if statObject:
                     self.stats.append(statObject)
+                    self.statAttributes.append(attribute)
                     self.statsDict[column_header(statObject.type, getattr(statObject, 'unit', None))] = statObject
 
         return self
@@ -1684,6 +1866,25 @@ class MeasurementPoint(object):
             self.name, list_to_str(self.stats), dict_to_str(self.statsDict),
             list_to_str(self.configurableStats), dict_to_str(self.configurableStatsDict))
 
+    def merge(self, other):
+        """
+        Merge in the stats of the same measurement point from another
+        response, in the order a single response would have listed them
+        """
+        def mergeSorted(attributes, stats, otherAttributes, otherStats):
+            merged = sorted(zip(attributes + otherAttributes, stats + otherStats),
+                            key=lambda item: item[0])
+            return [item[0] for item in merged], [item[1] for item in merged]
+
+        self.statAttributes, self.stats = mergeSorted(
+            self.statAttributes, self.stats, other.statAttributes, other.stats)
+        self.configurableStatAttributes, self.configurableStats = mergeSorted(
+            self.configurableStatAttributes, self.configurableStats,
+            other.configurableStatAttributes, other.configurableStats)
+        self.statsDict.update(other.statsDict)
+        self.configurableStatsDict.update(other.configurableStatsDict)
+        return self
+
     def toCsv(self, output):
         output.writerow([self.name])
         for stat in sorted(self.stats, key=lambda stat: stat.type):
@@ -1702,6 +1903,89 @@ class Statistic(object):
         return self
 
 
+class IntSeries(object):
+    """
+    A space separated series of integers from a response, held in an
+    array('q') rather than a list of int objects. Missing points ("-") are
+    tracked in a validity mask, and read back as "-" like
+    str_to_list_of_ints returns them
+    """
+    __slots__ = ('data', 'valid')
+
+    def __init__(self):
+        self.data = array.array('q')
+        # None while every point is present
+        self.valid = None
+
+    def fromResponse(self, response):
+        if not response:
+            return self
+        parts = response.split(' ')
+        if '-' in parts:
+            self.valid = bytearray(b'\x01') * len(parts)
+            index = parts.index('-')
+            while True:
+                parts[index] = '0'
+                self.valid[index] = 0
+                try:
+                    index = parts.index('-', index + 1)
+                except ValueError:
+                    break
+        self.data = array.array('q', map(int, parts))
+        return self
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        if self.valid is not None and not self.valid[index]:
+            return '-'
+        return self.data[index]
+
+    def __iter__(self):
+        if self.valid is None:
+            return iter(self.data)
+        return (value if valid else '-' for value, valid in zip(self.data, self.valid))
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class ScaledSeries(object):
+    """
+    Read-only view of an IntSeries as the strings written to csv, i.e.
+    value_to_str(value, factor), or value_to_str(weight * value, factor)
+    when a series of weights is given. The factor is only applied to the
+    points actually read
+    """
+    __slots__ = ('series', 'factor', 'weights')
+
+    def __init__(self, series, factor, weights=None):
+        self.series = series
+        self.factor = factor
+        self.weights = weights
+
+    def __len__(self):
+        if self.weights is None:
+            return len(self.series)
+        return min(len(self.series), len(self.weights))
+
+    def __getitem__(self, index):
+        value = self.series[index]
+        if self.weights is not None:
+            weight = self.weights[index]
+            if value == '-' or weight == '-':
+                return ''
+            value = weight * value
+        return value_to_str(value, self.factor)
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def __repr__(self):
+        return repr(list(self))
+
+
 class TimeSeriesBase(object):
     def __init__(self):
         self.startTimes = None
@@ -1711,8 +1995,8 @@ class TimeSeriesBase(object):
         self.configChanges = None
 
     def fromResponse(self, response):
-        self.startTimes = str_to_list_of_ints(response.startTimes)
-        self.endTimes = str_to_list_of_ints(response.endTimes)
+        self.startTimes = IntSeries().fromResponse(response.startTimes)
+        self.endTimes = IntSeries().fromResponse(response.endTimes)
         self.factor = int(response.factor)
         self.availability = int(response.availability)
         self.configChanges = response.configChanges
@@ -1720,24 +2004,21 @@ class TimeSeriesBase(object):
 
     def setTimeseriesValuesFromResponse(self, response):
         if hasattr(response, 'values'):
-            self.values = str_to_list_of_ints(response.values)
+            self.values = IntSeries().fromResponse(response.values)
         else:
-            self.mins = str_to_list_of_ints(response.mins)
-            self.means = str_to_list_of_ints(response.means)
-            self.maxs = str_to_list_of_ints(response.maxs)
-            self.counts = str_to_list_of_ints(response.counts)
+            self.mins = IntSeries().fromResponse(response.mins)
+            self.means = IntSeries().fromResponse(response.means)
+            self.maxs = IntSeries().fromResponse(response.maxs)
+            self.counts = IntSeries().fromResponse(response.counts)
 
     def createTimeseriesColumns(self, column_name):
         self.timeSeriesValues = {}
         if self.values is not None:
-            self.timeSeriesValues[column_name] = [value_to_str(i, self.factor) for i in self.values]
+            self.timeSeriesValues[column_name] = ScaledSeries(self.values, self.factor)
         else:
             #reporting period is > 24 hours; expect different response format
             if self.means is not None and self.counts is not None:
-                vs = []
-                for (c,m) in zip(self.counts, self.means):
-                    vs.append(value_to_str(c*m, self.factor))
-                self.timeSeriesValues[column_name] = vs
+                self.timeSeriesValues[column_name] = ScaledSeries(self.means, self.factor, self.counts)
 
     def getRoundingErrorPostfix(self):
         if self.values is None and  self.counts is not None and len(self.counts) > 0:
@@ -1988,8 +2269,8 @@ class KeyData(object):
 
     def fromResponse(self, response):
         self.key = response._key
-        self.bitRate = str_to_list_of_ints(response.bitRate)
-        self.packetRate = str_to_list_of_ints(response.packetRate)
+        self.bitRate = IntSeries().fromResponse(response.bitRate)
+        self.packetRate = IntSeries().fromResponse(response.packetRate)
         return self
 
     def __str__(self):
@@ -2014,7 +2295,7 @@ class DistributionData(object):
 
     def fromResponse(self, response):
         self.quantile = response._quantile
-        self.values = str_to_list_of_ints(response.values)
+        self.values = IntSeries().fromResponse(response.values)
         self.min = str(response.min)
         self.mean = str(response.mean)
         self.max = str(response.max)
@@ -2051,8 +2332,8 @@ class TimeSeriesDistribution(TimeSeriesBase, UnitMixin):
         self.quantiles = []
         for data in response.data:
             self.quantiles.append(DistributionData().fromResponse(data))
-        self.startTimes = str_to_list_of_ints(response.startTimes)
-        self.endTimes = str_to_list_of_ints(response.endTimes)
+        self.startTimes = IntSeries().fromResponse(response.startTimes)
+        self.endTimes = IntSeries().fromResponse(response.endTimes)
         return self
 
     def __str__(self):
@@ -2103,7 +2384,7 @@ class TimeSeriesDistributionStatistic(TimeSeriesDistribution, Statistic):
             for quantile in self.quantiles:
                 if quantile.quantile == name:
                     self.timeSeriesColumns.append(column_name)
-                    self.timeSeriesValues[column_name] = [value_to_str(i, self.factor) for i in quantile.values]
+                    self.timeSeriesValues[column_name] = ScaledSeries(quantile.values, self.factor)
 
 
         self.timeSeriesColumns = []
@@ -2164,8 +2445,8 @@ class TimeSeriesDistributionConfigurableStatistic(TimeSeriesBase,
         self.quantiles = []
         for data in response.data:
             self.quantiles.append(DistributionData().fromResponse(data))
-        self.startTimes = str_to_list_of_ints(response.startTimes)
-        self.endTimes = str_to_list_of_ints(response.endTimes)
+        self.startTimes = IntSeries().fromResponse(response.startTimes)
+        self.endTimes = IntSeries().fromResponse(response.endTimes)
 
         def addSummary(name):
             column_name = self.columnName(name)
@@ -2191,7 +2472,7 @@ class TimeSeriesDistributionConfigurableStatistic(TimeSeriesBase,
             self.timeSeriesColumns.append(column_name)
             for quantile in self.quantiles:
                 if quantile.quantile == name:
-                    self.timeSeriesValues[column_name] = [value_to_str(i, self.factor) for i in quantile.values]
+                    self.timeSeriesValues[column_name] = ScaledSeries(quantile.values, self.factor)
 
 
         self.timeSeriesColumns = []
@@ -2806,8 +3087,243 @@ class TimeSeriesEventData(TimeSeriesBase, UnitMixin):
             self.startTimes, self.endTimes)
 
 
+class TimeRangeStitcher(object):
+    """
+    Joins the raw getStats responses for consecutive windows of one time
+    range (see split_time_range) into a single response, as if the range had
+    been requested at once. Each window keeps only the buckets starting
+    inside it, so there are no duplicate buckets at window edges.
+
+    Summary min, max, total and mean are worked out again from the kept
+    buckets, since a window's own summary can cover buckets outside it.
+    Percentile summaries cannot be combined from per-window values and are
+    left missing.
+    """
+    def __init__(self, windows):
+        self.windows = windows
+
+    def stitch(self, responses):
+        response = responses[0]
+        response._endTime = responses[-1]._endTime
+        names = []
+        measurementPoints = dict()
+        for index, windowResponse in enumerate(responses):
+            for measurementPoint in getattr(windowResponse, 'measurementPoint', []):
+                if measurementPoint._name not in measurementPoints:
+                    names.append(measurementPoint._name)
+                    measurementPoints[measurementPoint._name] = []
+                measurementPoints[measurementPoint._name].append((index, measurementPoint))
+        response.measurementPoint = []
+        for name in names:
+            response.measurementPoint.append(self.stitchMeasurementPoint(measurementPoints[name]))
+        return response
+
+    def stitchMeasurementPoint(self, parts):
+        measurementPoint = parts[0][1]
+        attributes = []
+        for index, windowMeasurementPoint in parts:
+            for attribute in dir(windowMeasurementPoint):
+                if not attribute.startswith('_') and attribute not in attributes and \
+                        not callable(getattr(windowMeasurementPoint, attribute)):
+                    attributes.append(attribute)
+        for attribute in attributes:
+            statParts = [(index, getattr(windowMeasurementPoint, attribute))
+                         for index, windowMeasurementPoint in parts
+                         if hasattr(windowMeasurementPoint, attribute)]
+            setattr(measurementPoint, attribute, self.stitchStat(attribute, statParts))
+        return measurementPoint
+
+    def stitchStat(self, attribute, parts):
+        stat = parts[0][1]
+        if isinstance(stat, list):
+            # statEventData and the configurable stat lists, matched by name
+            return self.stitchNamed(attribute, parts)
+        class_ = stat.__class__.__name__
+        if class_ in ('TimeSeries', 'TimeSeriesEventData'):
+            return self.stitchTimeSeries(parts)
+        elif class_ == 'TimeSeriesDistribution':
+            return self.stitchDistribution(parts)
+        elif class_ == 'TimeSeriesTopN':
+            return self.stitchTopN(parts)
+        elif class_ in ('ScalarValue', 'Distribution', 'TopN', 'Summary'):
+            raise StatsStitchException("%s statistics cannot be split into time windows" % (
+                getattr(stat, '_type', attribute),))
+        return stat
+
+    def stitchNamed(self, attribute, parts):
+        names = []
+        stats = dict()
+        for index, windowStats in parts:
+            for stat in windowStats:
+                if stat._name not in stats:
+                    names.append(stat._name)
+                    stats[stat._name] = []
+                stats[stat._name].append((index, stat))
+        return [self.stitchStat(attribute, stats[name]) for name in names]
+
+    def keptRanges(self, parts):
+        """
+        Slice of each window's buckets that start inside the window. The
+        first and last windows also keep buckets before or after the range
+        """
+        last = len(self.windows) - 1
+        ranges = dict()
+        for index, stat in parts:
+            startTimes = [int(startTime) for startTime in series_tokens(stat.startTimes)]
+            windowStart, windowEnd = self.windows[index]
+            lo = bisect.bisect_left(startTimes, windowStart) if index > 0 else 0
+            hi = bisect.bisect_left(startTimes, windowEnd) if index < last else len(startTimes)
+            ranges[index] = (lo, max(lo, hi))
+        return ranges
+
+    @staticmethod
+    def joinSeries(parts, ranges, getSeries):
+        """
+        Join the kept slice of a series from each window. getSeries returns
+        the series of a window's stat, or None where the window has none, in
+        which case its points are filled as missing
+        """
+        tokens = []
+        for index, stat in parts:
+            lo, hi = ranges[index]
+            series = getSeries(stat)
+            if series is None:
+                tokens.extend(['-'] * (hi - lo))
+            else:
+                windowTokens = series_tokens(series)[lo:hi]
+                tokens.extend(windowTokens + ['-'] * (hi - lo - len(windowTokens)))
+        return ' '.join(tokens)
+
+    def stitchBase(self, parts, ranges):
+        """Join the bucket times and combine the TimeSeriesBase scalars"""
+        stat = parts[0][1]
+        factors = set(str(windowStat.factor) for index, windowStat in parts)
+        if len(factors) > 1:
+            raise StatsStitchException("windows of a statistic have different factors: %s" % (
+                ', '.join(sorted(factors)),))
+        stat.startTimes = self.joinSeries(parts, ranges, lambda windowStat: windowStat.startTimes)
+        stat.endTimes = self.joinSeries(parts, ranges, lambda windowStat: windowStat.endTimes)
+        durations = [self.windows[index][1] - self.windows[index][0] for index, windowStat in parts]
+        stat.availability = stitch_mean([windowStat.availability for index, windowStat in parts], durations)
+        stat.configChanges = stitch_last([windowStat.configChanges for index, windowStat in parts])
+
+    def stitchTimeSeries(self, parts):
+        stat = parts[0][1]
+        ranges = self.keptRanges(parts)
+        # The summary of each window can include buckets outside the window,
+        # so the stitched summary is worked out from the kept buckets
+        if all(hasattr(windowStat, 'values') for index, windowStat in parts):
+            stat.values = self.joinSeries(parts, ranges, lambda windowStat: windowStat.values)
+            values = series_tokens(stat.values)
+            stat.min = stitch_min(values)
+            stat.max = stitch_max(values)
+            stat.total = stitch_total(values)
+            stat.mean = stitch_mean(values, [1] * len(values))
+        elif not any(hasattr(windowStat, 'values') for index, windowStat in parts):
+            for name in ('mins', 'means', 'maxs', 'counts'):
+                setattr(stat, name, self.joinSeries(parts, ranges,
+                                                    lambda windowStat: getattr(windowStat, name)))
+            means = series_tokens(stat.means)
+            counts = [int(count) if count != '-' else 0 for count in series_tokens(stat.counts)]
+            stat.min = stitch_min(series_tokens(stat.mins))
+            stat.max = stitch_max(series_tokens(stat.maxs))
+            stat.total = stitch_total(means, counts)
+            stat.mean = stitch_mean(means, counts)
+        else:
+            # Windows longer than a day come back as counts and means, shorter
+            # ones as values, and one cannot be turned into the other
+            raise StatsStitchException("%s windows came back with both values and means; "
+                                       "use a --points-per-request that keeps every window on the "
+                                       "same side of one day" % (getattr(stat, '_type', 'time series'),))
+
+        if hasattr(stat, 'lastViolationTime'):
+            latest = max(parts, key=lambda part: int(part[1].lastViolationTime)
+                         if part[1].lastViolationTime != '-' else -1)[1]
+            stat.lastViolationTime = latest.lastViolationTime
+            stat.lastViolationValue = latest.lastViolationValue
+        self.stitchBase(parts, ranges)
+        return stat
+
+    def stitchDistribution(self, parts):
+        stat = parts[0][1]
+        ranges = self.keptRanges(parts)
+        quantiles = []
+        for index, windowStat in parts:
+            for data in windowStat.data:
+                if data._quantile not in quantiles:
+                    quantiles.append(data._quantile)
+
+        def quantileData(windowStat, quantile):
+            for data in windowStat.data:
+                if data._quantile == quantile:
+                    return data
+            return None
+
+        stitchedData = []
+        for quantile in quantiles:
+            dataParts = [(index, quantileData(windowStat, quantile)) for index, windowStat in parts
+                         if quantileData(windowStat, quantile) is not None]
+            data = dataParts[0][1]
+            data.values = self.joinSeries(parts, ranges,
+                lambda windowStat: getattr(quantileData(windowStat, quantile), 'values', None))
+            values = series_tokens(data.values)
+            data.min = stitch_min(values)
+            data.max = stitch_max(values)
+            data.mean = stitch_mean(values, [1] * len(values))
+            counts = [getattr(windowData, 'count', None) for index, windowData in dataParts]
+            if hasattr(data, 'count'):
+                data.count = stitch_total(counts)
+            if hasattr(data, 'summaryValue'):
+                summaryValues = [getattr(windowData, 'summaryValue', None) for index, windowData in dataParts]
+                if quantile == 'min':
+                    data.summaryValue = data.min
+                elif quantile == 'max':
+                    data.summaryValue = data.max
+                elif quantile == 'mean':
+                    data.summaryValue = stitch_mean(summaryValues,
+                        [int(count) if count not in (None, '-') else 0 for count in counts])
+                else:
+                    data.summaryValue = '-'
+            stitchedData.append(data)
+        stat.data = stitchedData
+        self.stitchBase(parts, ranges)
+        return stat
+
+    def stitchTopN(self, parts):
+        stat = parts[0][1]
+        ranges = self.keptRanges(parts)
+        keys = []
+        for index, windowStat in parts:
+            for keyData in getattr(windowStat, 'keyData', []):
+                if keyData._key not in keys:
+                    keys.append(keyData._key)
+
+        def keyData(windowStat, key):
+            for data in getattr(windowStat, 'keyData', []):
+                if data._key == key:
+                    return data
+            return None
+
+        stitchedKeyData = []
+        for key in keys:
+            data = [keyData(windowStat, key) for index, windowStat in parts
+                    if keyData(windowStat, key) is not None][0]
+            data.bitRate = self.joinSeries(parts, ranges,
+                lambda windowStat: getattr(keyData(windowStat, key), 'bitRate', None))
+            data.packetRate = self.joinSeries(parts, ranges,
+                lambda windowStat: getattr(keyData(windowStat, key), 'packetRate', None))
+            stitchedKeyData.append(data)
+        if keys:
+            stat.keyData = stitchedKeyData
+        self.stitchBase(parts, ranges)
+        return stat
+
+
 class CorvilApiStatsClient(object):
     SOCKET_TIMEOUT_SECONDS = 3600
+    BATCH_WORKERS = 4
+    DEFAULT_RESOLUTION_MINUTES = 5
+    VALUES_WINDOW_MS = 24 * 3600 * 1000
 
     """
     Simple class to wrap the SUDS service
@@ -2846,6 +3362,21 @@ class CorvilApiStatsClient(object):
         except suds.MethodNotFound:
             self.hostIsLmc = False
 
+    def clone(self):
+        """
+        Copy of this client for use on another thread. Suds clients are not
+        thread safe; the copy shares the parsed WSDL but has its own options,
+        transport and plugins
+        """
+        clone = copy.copy(self)
+        clone.requestAttributes = SudsParameterPlugin()
+        clone.requestAttributes.setAttrs(dict(self.requestAttributes.attrs))
+        clone.rootAttributePlugin = SudsRootAttributePlugin()
+        clone.sudsClient = self.sudsClient.clone()
+        clone.sudsClient.set_options(
+            plugins=[clone.requestAttributes, clone.rootAttributePlugin])
+        return clone
+
     def createElement(self, name, nameAttr=None):
         """
         Create a named element to assemble a request
@@ -3102,6 +3633,23 @@ class CorvilApiStatsClient(object):
         if endTime:
             endTime /= 1e6
             endTime = int(endTime)
+        return self.requestStats(mps, cne, stats, configurableStats, percentiles,
+                                 reporting_period, startTime, endTime, events)
+
+    def requestStats(self, mps, cne, stats, configurableStats, percentiles,
+                     reporting_period, startTime, endTime, events):
+        """
+        getStats with the time range, if any, already in milliseconds
+        """
+        response = self.requestRawStats(mps, cne, stats, configurableStats, percentiles,
+                                        reporting_period, startTime, endTime, events)
+        return StatsResponse().fromResponse(response, percentiles)
+
+    def requestRawStats(self, mps, cne, stats, configurableStats, percentiles,
+                        reporting_period, startTime, endTime, events):
+        """
+        requestStats returning the suds response rather than a StatsResponse
+        """
         kwargs = {}
 
         if self.hostIsLmc and cne is None:
@@ -3125,8 +3673,101 @@ class CorvilApiStatsClient(object):
 
         kwargs['configurableStat'] = configurableStats
         kwargs['statEventData'] = events
-        response = self.sudsClient.service.getStats(**kwargs)
-        return StatsResponse().fromResponse(response, percentiles)
+        return self.sudsClient.service.getStats(**kwargs)
+
+    def getStatsBatched(self, mps, cne, stats, configurableStats, percentiles,
+                        reporting_period, startTime, endTime, events,
+                        mpsPerRequest=None, statsPerRequest=None, workers=BATCH_WORKERS,
+                        pointsPerRequest=None, resolutionMinutes=None):
+        """
+        getStats split into requests of at most mpsPerRequest measurement
+        points and statsPerRequest stats (stats, configurable stats and event
+        stats counted together), run on a pool of workers each with its own
+        suds client. The responses are merged into one StatsResponse.
+
+        With pointsPerRequest, a time range is also split into windows of that
+        many buckets of resolutionMinutes (default DEFAULT_RESOLUTION_MINUTES),
+        and the windows of each request are stitched back together. The server
+        returns values for windows up to VALUES_WINDOW_MS and counts and means
+        for longer ones, so when the windows are longer than that a short
+        window at either end is merged into its neighbour
+        """
+        if startTime:
+            startTime /= 1e6
+            startTime = int(startTime)
+        if endTime:
+            endTime /= 1e6
+            endTime = int(endTime)
+
+        windows = [(startTime, endTime)]
+        if pointsPerRequest and startTime and endTime:
+            if not resolutionMinutes:
+                resolutionMinutes = self.DEFAULT_RESOLUTION_MINUTES
+            windows = split_time_range(startTime, endTime, resolutionMinutes * 60000, pointsPerRequest)
+            if resolutionMinutes * 60000 * pointsPerRequest > self.VALUES_WINDOW_MS:
+                windows = merge_short_windows(windows, self.VALUES_WINDOW_MS)
+
+        statSpecs = [('stat', stat) for stat in stats] + \
+                    [('conf', stat) for stat in configurableStats] + \
+                    [('event', stat) for stat in events]
+        chunks = []
+        for mpChunk in chunk_list(mps, mpsPerRequest):
+            for statChunk in chunk_list(statSpecs, statsPerRequest):
+                chunks.append((mpChunk,
+                               [stat for kind, stat in statChunk if kind == 'stat'],
+                               [stat for kind, stat in statChunk if kind == 'conf'],
+                               [stat for kind, stat in statChunk if kind == 'event']))
+
+        responses = [[None] * len(windows) for chunk in chunks]
+        if not (startTime and endTime) and len(chunks) > 1:
+            # The server resolves a reporting period when each request arrives.
+            # Fetch one chunk first and pin the rest to its time range, so all
+            # chunks share one bucket grid
+            mpChunk, chunkStats, chunkConfStats, chunkEvents = chunks[0]
+            response = self.requestRawStats(mpChunk, cne, chunkStats, chunkConfStats, percentiles,
+                                            reporting_period, startTime, endTime, chunkEvents)
+            responses[0][0] = response
+            startTime, endTime = int(response._startTime), int(response._endTime)
+            windows = [(startTime, endTime)]
+
+        local = threading.local()
+        def fetch(request):
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = self.clone()
+                if len(windows) > 1:
+                    client.requestAttributes.addAttr('resolutionMinutes', str(resolutionMinutes))
+            chunk, window = request
+            mpChunk, chunkStats, chunkConfStats, chunkEvents = chunks[chunk]
+            windowStart, windowEnd = windows[window]
+            return client.requestRawStats(mpChunk, cne, chunkStats, chunkConfStats, percentiles,
+                                          reporting_period, windowStart, windowEnd, chunkEvents)
+
+        requests = [(chunk, window) for chunk in range(len(chunks)) for window in range(len(windows))
+                    if responses[chunk][window] is None]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(fetch, request) for request in requests]
+            try:
+                for request, future in zip(requests, futures):
+                    chunk, window = request
+                    responses[chunk][window] = future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        stitcher = TimeRangeStitcher(windows)
+        response = None
+        for chunkResponses in responses:
+            if len(windows) > 1:
+                chunkResponse = StatsResponse().fromResponse(stitcher.stitch(chunkResponses), percentiles)
+            else:
+                chunkResponse = StatsResponse().fromResponse(chunkResponses[0], percentiles)
+            if response is None:
+                response = chunkResponse
+            else:
+                response.merge(chunkResponse)
+        return response
 
     def getSummary(self, reporting_period, filter):
         """
@@ -3264,6 +3905,186 @@ class CorvilApiStatsClient(object):
             raise MethodNotAvailableException("getLensData not available on Stats XML API")
 
 
+class LiveStatsSession(object):
+    """
+    A live stats session for one stats group on one CNE or CMC, as polled by
+    LiveStatsCollector. Each session has its own suds client, so sessions can
+    be polled concurrently
+    """
+    def __init__(self, client, statsGroup, output, updatePeriod,
+                 historySize=LIVE_HISTORY_SIZE, iterations=-1, label=None):
+        self.client = client
+        self.statsGroup = statsGroup
+        self.output = output
+        self.updatePeriod = int(updatePeriod)
+        self.historySize = historySize
+        self.iterations = iterations
+        self.label = label if label else client.host
+        self.sessionId = None
+        self.timestamp = None
+        self.confstats = None
+        self.rows = 0
+        self.error = None
+        self.pending = None
+
+    def open(self):
+        self.client.requestAttributes.addAttr("historySize", self.historySize)
+        self.client.requestAttributes.addAttr("updatePeriod", str(self.updatePeriod))
+        self.sessionId = self.client.createLiveStatsSession(self.statsGroup)
+        self.timestamp = None
+
+    def poll(self):
+        """
+        Get the updates since the previous poll, returning the response and
+        its timestamp
+        """
+        liveResponse = self.client.getLiveStats(self.sessionId, self.statsGroup)
+        return liveResponse, liveResponse.statsGroup[0]._timestamp
+
+    def close(self):
+        if self.sessionId is None:
+            return
+        sessionId, self.sessionId = self.sessionId, None
+        self.client.requestAttributes.removeAttr("historySize")
+        self.client.requestAttributes.removeAttr("updatePeriod")
+        self.client.closeLiveStatsSession(sessionId)
+
+    def reset(self):
+        """
+        Close a session that failed, ignoring errors, so that it is opened
+        again on the next poll
+        """
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def done(self):
+        return self.error is not None or (self.iterations >= 0 and self.rows >= self.iterations)
+
+    def write(self, liveResponse, timestamp):
+        """
+        Write the rows of a poll response not written by earlier polls
+        """
+        previousTimestamp, self.timestamp = self.timestamp, timestamp
+        if previousTimestamp is None or previousTimestamp == timestamp:
+            # First poll of the session, or nothing new
+            return
+        # the response carries up to historySize updates, write the ones since the previous poll
+        elapsed = int(timestamp) - int(previousTimestamp)
+        historyLimit = min(int(elapsed / self.updatePeriod), self.historySize)
+        rowLimit = min(historyLimit, self.iterations - self.rows) if self.iterations >= 0 else None
+
+        response = LiveStatsResponse().fromResponse(liveResponse)
+        if self.confstats is None:
+            self.confstats = response.printHeader(self.output)
+        response.toCsv(self.output, self.confstats, historyLimit=historyLimit, rowLimit=rowLimit)
+        self.rows += historyLimit
+
+
+class LiveStatsCollector(object):
+    """
+    Polls live stats sessions on any number of CNEs and CMCs from one asyncio
+    event loop. Every session is polled on absolute deadlines, updatePeriod
+    seconds apart from the start, so request latency does not add to the
+    period. A poll that overruns skips to the next deadline and the session
+    history fills in the updates in between. The blocking suds calls run on a
+    pool of workers threads, one per session if workers is not given.
+
+    A session that cannot be created is reported and dropped. A session
+    whose poll fails is closed and opened again on its next deadline. All
+    sessions are closed when the collector stops, including on
+    KeyboardInterrupt, once any call still running on their client is done.
+    """
+    def __init__(self, updatePeriod, workers=None):
+        self.updatePeriod = int(updatePeriod)
+        self.workers = workers
+        self.sessions = []
+
+    def addSession(self, session):
+        self.sessions.append(session)
+        return session
+
+    def run(self):
+        """
+        Poll until every session is done, returning the sessions that failed
+        """
+        loop = asyncio.new_event_loop()
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers or max(len(self.sessions), 1))
+        tasks = []
+        collecting = None
+        try:
+            start = loop.time()
+            tasks = [loop.create_task(self.pollSession(loop, executor, session, start))
+                     for session in self.sessions]
+            collecting = asyncio.gather(*tasks)
+            loop.run_until_complete(collecting)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            if collecting is not None and collecting.done() and not collecting.cancelled():
+                # interrupted: the tasks were cancelled above, don't report it as unhandled
+                collecting.exception()
+            loop.close()
+            self.close(executor)
+            executor.shutdown()
+        return [session for session in self.sessions if session.error is not None]
+
+    def close(self, executor):
+        # a cancelled poll keeps running on its thread, and the session's suds
+        # client cannot be shared with the close
+        concurrent.futures.wait([session.pending for session in self.sessions if session.pending])
+        openSessions = [session for session in self.sessions if session.sessionId is not None]
+        for session, future in [(session, executor.submit(session.close)) for session in openSessions]:
+            try:
+                future.result()
+            except Exception as exception:
+                print("Error closing live stats session on %s: %s" % (session.label, exception))
+
+    def nextDeadline(self, deadline, now):
+        deadline += self.updatePeriod
+        if deadline < now:
+            deadline += math.ceil((now - deadline) / self.updatePeriod) * self.updatePeriod
+        return deadline
+
+    @staticmethod
+    async def call(executor, session, method):
+        """
+        Run a blocking call of the session on the executor, keeping its future
+        so that close can wait for it
+        """
+        session.pending = executor.submit(method)
+        return await asyncio.wrap_future(session.pending)
+
+    async def pollSession(self, loop, executor, session, deadline):
+        while True:
+            if session.sessionId is None:
+                try:
+                    await self.call(executor, session, session.open)
+                except Exception as exception:
+                    if isinstance(exception, suds.WebFault):
+                        exception = exception.fault.faultstring
+                    session.error = exception
+                    print("Error attempting to create live stats session on %s: %s" % (
+                        session.label, exception))
+                    return
+            try:
+                liveResponse, timestamp = await self.call(executor, session, session.poll)
+                session.write(liveResponse, timestamp)
+            except Exception as exception:
+                if isinstance(exception, suds.WebFault):
+                    exception = exception.fault.faultstring
+                print("Error retrieving live stats from %s: %s" % (session.label, exception))
+                await self.call(executor, session, session.reset)
+            if session.done():
+                return
+            deadline = self.nextDeadline(deadline, loop.time())
+            await asyncio.sleep(deadline - loop.time())
+
+
 def usage(error=""):
     """
     Print out error message, followed by program usage, and exit
@@ -3277,29 +4098,6 @@ def version():
     sys.exit(0)
 
 
-def liveUpdate(client, timestamp, session, statsGroup):
-    """
-    Repeatedly request live stats
-    """
-    try:
-        # Set the timestamp on the statsGroup. In every iteration we'll use the timestamp returned
-        # from the previous call, this ensures we'll retrieve all the data
-        #statsGroup._timestamp = timestamp
-        #statsGroup._name = "statsgroupname"
-        liveResponse = client.getLiveStats(session, statsGroup)
-        # print
-        # print "Received live response:"
-        # print str(liveResponse)
-    except suds.WebFault as webFault:
-        print("Error retrieving live stats: %s" % webFault.fault.faultstring)
-        sys.exit(1)
-
-    # Get the timestamp from the response and return it so that liveUpdate can
-    # be called again.
-    newTimestamp = liveResponse.statsGroup[0]._timestamp
-    return (liveResponse, newTimestamp)
-
-
 def validate_time(start_time, end_time):
     if start_time <= 0 or end_time <= 0:
         usage("Invalid custom time format, should be epoch in milliseconds")
@@ -3338,6 +4136,12 @@ def parseArgs(args):
     parser.add_option("-R", "--resolutionMinutes", type="int")
     parser.add_option("-b", "--business-hours", type="string", default=None)
     parser.add_option("-g", "--grouping", type="string", default=None)
+    parser.add_option("--mps-per-request", type="int")
+    parser.add_option("--stats-per-request", type="int")
+    parser.add_option("--workers", type="int")
+    parser.add_option("--points-per-request", type="int")
+    parser.add_option("--hosts")
+    parser.add_option("--mps-per-session", type="int")
 
     (options, args) = parser.parse_args()
 
@@ -3350,6 +4154,19 @@ def parseArgs(args):
     if options.timeout <= 0:
         usage('Timeout must be a positive number')
 
+    if options.mps_per_request is not None and options.mps_per_request <= 0:
+        usage('Measurement points per request must be a positive number')
+    if options.stats_per_request is not None and options.stats_per_request <= 0:
+        usage('Statistics per request must be a positive number')
+    if options.workers is not None and options.workers <= 0:
+        usage('Workers must be a positive number')
+    if options.points_per_request is not None and options.points_per_request <= 0:
+        usage('Points per request must be a positive number')
+    if options.mps_per_session is not None and options.mps_per_session <= 0:
+        usage('Measurement points per session must be a positive number')
+    if options.hosts and command != 'live-stats':
+        usage('--hosts is only supported by the live-stats command')
+
     if command == 'message-protocols-details':
         if len(args) < 3:
             usage('Missing <protocol-name>')
@@ -3437,6 +4254,15 @@ def parseArgs(args):
         host = parts[0]
         port = parts[1]
 
+    hosts = []
+    for extraHost in options.hosts.split(',') if options.hosts else []:
+        parts = extraHost.split(':', 2)
+        if len(parts) == 2:
+            hosts.append((parts[0], parts[1]))
+        else:
+            hosts.append((extraHost, 5101))
+    options.hosts = hosts
+
     return options, command, host, port
 
 
@@ -3492,6 +4318,8 @@ def validateOptions(options, command, hostIsLmc):
         if options.reporting_period is None and not (options.start_time and options.end_time):
             usage("A reporting period or time range must be specified for the %s command" %
                   command)
+        if options.points_per_request and not (options.start_time and options.end_time):
+            usage("--points-per-request requires a time range (-s <start-time> -e <end-time>)")
 
     if command in ('summary'):
         if options.reporting_period is None:
@@ -3597,93 +4425,70 @@ def main(argv=None):
         if options.resolutionMinutes:
             client.requestAttributes.addAttr('resolutionMinutes', str(options.resolutionMinutes))
         try:
-            statsResponse = client.getStats(
-                options.measurement_point, options.cne, options.stat,
-                options.conf_stat, options.requestedPercentiles,
-                options.reporting_period, options.start_time, options.end_time, options.stat_event)
+            if options.mps_per_request or options.stats_per_request or options.points_per_request:
+                statsResponse = client.getStatsBatched(
+                    options.measurement_point, options.cne, options.stat,
+                    options.conf_stat, options.requestedPercentiles,
+                    options.reporting_period, options.start_time, options.end_time, options.stat_event,
+                    mpsPerRequest=options.mps_per_request, statsPerRequest=options.stats_per_request,
+                    workers=options.workers or CorvilApiStatsClient.BATCH_WORKERS,
+                    pointsPerRequest=options.points_per_request,
+                    resolutionMinutes=options.resolutionMinutes)
+            else:
+                statsResponse = client.getStats(
+                    options.measurement_point, options.cne, options.stat,
+                    options.conf_stat, options.requestedPercentiles,
+                    options.reporting_period, options.start_time, options.end_time, options.stat_event)
             outputHeader(command, options, host, port)
             outputCsv(statsResponse)
 
         except suds.WebFault as webFault:
             print("Error attempting to fetch stats: %s" % webFault.fault.faultstring)
             sys.exit(1)
+        except StatsStitchException as exception:
+            print("Error attempting to fetch stats: %s" % exception)
+            sys.exit(1)
 
     elif command == "live-stats":
-        
-        liveHistorySize = 8
-        client.requestAttributes.addAttr("historySize", liveHistorySize)
-        client.requestAttributes.addAttr("updatePeriod", options.update_period)
-
-        statsGroup = client.createLiveStatsGroup(
-            options.stat, options.conf_stat,
-            options.requestedPercentiles,
-            options.measurement_point)
-        createSessionResponse = None
-        try:
-            # For live stats requests we have to create live session first, then retrieve the
-            # returned session number, and use that session number in our subsequent live stats
-            # requests.
-            createSessionResponse = client.createLiveStatsSession(statsGroup)
-
-            # The response that SUDS returns is just the contents of the first child element in
-            # the response. In this case it's simply the session number.
-            # print "Created live stats session #%s" % createSessionResponse
-
-            # Now call the initial getLiveStats, with a null timestamp'''
-            newTimestamp = None
-            previousTimestamp = None
-            iterationCounter = 0
-            maxIterations = -1
-            if options.iterations:
-                maxIterations = int(options.iterations)
-            output = NonEmptyRowCsvWriter(csv.writer(sys.stdout))
-            headerWritten = False
-            confstats = dict() 
-            
-            outputHeader(command, options, host, port)
-            
-            updatePeriod = int(options.update_period)
-            while maxIterations >= 0 and iterationCounter < maxIterations or maxIterations < 0:
-                previousTimestamp = newTimestamp
-                liveResponse, newTimestamp = liveUpdate(client, newTimestamp, createSessionResponse, statsGroup)
-                
-                if previousTimestamp == None or previousTimestamp == newTimestamp:
-                    """ Do nothing. This is either the first iteration of the loop OR
-                        the timestamps are the same, so nothing to do. """
-                    pass
-                else:
-                    """ work out how many rows we need, somewhere between 1 and liveHistorySize"""
-                    elapsed = int(newTimestamp) - int(previousTimestamp)
-                    historyLimit = min(int(elapsed / updatePeriod), liveHistorySize)
-                    
-                    """now if we've returned a pile more rows than we need because we have a maxIterations, then 
-                       we have to pass a 'rowLimit' to the csv Output as well"""
-                    rowLimit = min(historyLimit, maxIterations - iterationCounter) if maxIterations != -1 else None
-                    
-                    response = LiveStatsResponse().fromResponse(liveResponse)
-                
-                    if not headerWritten:
-                        headerWritten = True
-                        confstats = response.printHeader(output)
-                    response.toCsv(output, confstats, historyLimit = historyLimit, rowLimit = rowLimit)
-                    iterationCounter += historyLimit
-                
-                #finally, lets just do this sleep IFF we're actually doing another iteration.
-                #previously it would do it every time, which was a bit annoying if your update
-                #period was 30 seconds and you had to wait for 30 seconds
-                if (maxIterations >= 0 and iterationCounter < maxIterations) or maxIterations < 0:
-                    time.sleep(updatePeriod)
+        # the first host plus any --hosts, each polled with the same groups of measurement points
+        hosts = [(host, port, client)]
+        for extraHost, extraPort in options.hosts:
+            extraClient = CorvilApiStatsClient(extraHost,
+                username=options.user, password=options.password,
+                cne=options.cne, port=int(extraPort), useHttps=options.https, timeout=options.timeout)
+            validateMeasurementPoints(
+                options.measurement_point, extraClient.hostIsLmc and options.cne is None)
+            hosts.append((extraHost, extraPort, extraClient))
+        mpGroups = chunk_list(options.measurement_point, options.mps_per_session)
+
+        maxIterations = -1
+        if options.iterations:
+            maxIterations = int(options.iterations)
+        output = UniqueHeaderCsvWriter(NonEmptyRowCsvWriter(csv.writer(sys.stdout)))
+        outputHeader(command, options, host, port)
 
-        except suds.WebFault as webFault:
-            print("Error attempting to create live stats session: %s" % webFault.fault.faultstring)
-            sys.exit(1)
+        collector = LiveStatsCollector(options.update_period, workers=options.workers)
+        for sessionHost, sessionPort, hostClient in hosts:
+            label = '%s:%s' % (sessionHost, sessionPort)
+            for mpGroup in mpGroups:
+                # one client per session, so that sessions can be polled concurrently
+                sessionClient = hostClient.clone()
+                statsGroup = sessionClient.createLiveStatsGroup(
+                    options.stat, options.conf_stat,
+                    options.requestedPercentiles, mpGroup)
+                sessionOutput = output
+                if len(hosts) > 1 or len(mpGroups) > 1:
+                    sessionOutput = PrefixedCsvWriter(output, label)
+                collector.addSession(LiveStatsSession(
+                    sessionClient, statsGroup, sessionOutput, options.update_period,
+                    iterations=maxIterations, label=label))
+        try:
+            failed = collector.run()
         except KeyboardInterrupt:
             print("Exiting...")
-            if createSessionResponse != None:
-                client.requestAttributes.removeAttr("historySize")
-                client.requestAttributes.removeAttr("updatePeriod")
-                client.closeLiveStatsSession(createSessionResponse)
             sys.exit(0)
+        if failed:
+            sys.exit(1)
 
     elif command == "summary":
         outputHeader(command, options, host, port)
@@ -37,6 +37,7 @@ Get message CSV
 Get packet CSV
 
     multihop-csv    <host> <mp> <packet_timestamp> <packet_id> <message_index>
+    multihop-csv    <host> <mp> --batch <file>
 Get multihop CSV
 
     lens-csv        <host> <period> [<view>]
@@ -98,9 +99,72 @@ Arguments:
     -d                      Optional Message filter delimiter (default is ':')
     -z                      Use https to access the CNE
     -g                      Specify snaplength for PCAP Export (pcap)
-    -F                      Optional output format either uncompressed, zip or gzip.
+    -F                      Optional output format either uncompressed, zip, gzip or parquet.
                             uncompressed is the default if not specified.
+                            parquet converts the CSV to typed columns client side
+                            and needs --output and the pyarrow package
+                            (message-csv, packet-csv, flow-index)
     -T <timeout-seconds>    Request timeout in seconds, default value: 3600
+    --parallel <n>          Split the time range into n contiguous slices and
+                            fetch them concurrently, merging the results into
+                            one pcap (pcap, uncompressed output only) or the
+                            --rollup/--group-by aggregates (flow-index)
+    --output <file>         Write the data to a file instead of stdout, keeping a
+                            <file>.ckpt checkpoint of the last complete record
+                            (pcap, message-csv, packet-csv)
+    --preallocate           Write --output through a sliding memory map, allocating
+                            the file in 256 MiB extents ahead of it and truncating
+                            it to size at the end. A killed download is left at
+                            its allocated size, zero padded, until --resume
+                            truncates it
+    --resume                Continue an interrupted --output download from its
+                            checkpoint: the file is truncated to the last good
+                            record and the rest of the time range re-requested
+    --compress <c>[:<level>]
+                            Compress the output client side with gzip, zstd or lz4,
+                            at the given or the default level (6, 3, 0), on a
+                            separate thread from the network reads. zstd and lz4
+                            need the zstandard and lz4 packages. Needs -F
+                            uncompressed and stdout output
+    --stats                 Print the timings of each stream on stderr at the end:
+                            connect, send, first header and first data times, bytes,
+                            blocks, time stalled waiting for data and MB/s
+    --prefetch <n>          Read the responses ahead on a separate thread into a
+                            ring of n blocks of 1 MiB, and print on stderr how long
+                            the reader and the writer each waited for the other
+    --index <n>             With --output, also write a <file>.idx time index of
+                            every n'th record, for PcapFile.PcapIndexedReader to
+                            seek to a time window with (pcap)
+    --all-cnes              On a CMC, run the command against every CNE it manages
+                            that has the mp, instead of the -x one, and merge the
+                            CSVs on their timestamp column, with a leading cne column
+                            (gap-csv, message-csv, packet-csv)
+    --workers <n>           Number of CNEs streamed at once by --all-cnes, or
+                            message IDs looked up at once by --batch, default: 4
+    --output-dir <dir>      With --all-cnes, keep one <dir>/<cne>.csv per CNE
+                            instead of merging
+    --split <flow|vlan>     Split the pcap into one <dir>/<name>.pcap per TCP/UDP
+                            flow (both directions) or per VLAN ID as it streams,
+                            in the --output-dir <dir> (pcap)
+    --max-open-files <n>    Number of --split files kept open at once, default: 256
+    --rollup <duration>     Aggregate the flow-index rows client side into time buckets
+                            of the timestamp column, e.g. 100ms, 5s, 1m (flow-index)
+    --group-by <columns>    Comma-separated columns to aggregate the flow-index rows by,
+                            within each --rollup bucket if given (flow-index)
+    --sum <columns>         Comma-separated columns summed by --rollup/--group-by,
+                            default: the numeric columns. With --parallel the time
+                            range is fetched as slices whose aggregates are merged
+    --gap-stats             Instead of the gap CSV, print a summary of it per session:
+                            the count, total, mean and largest gap, and a histogram
+                            of the gap sizes in power of two buckets (gap-csv)
+    --gap-keys <columns>    Comma-separated --gap-stats key columns, default: the
+                            columns with session or symbol in their names
+    --gap-column <column>   --gap-stats gap size column, default: the first column
+                            with gap in its name
+    --batch <file>          Look up the multihop path of every message ID in <file>
+                            (- for stdin), one <packet_timestamp>,<packet_id>,<message_index>
+                            per line, writing one CSV with those three columns first
+                            (multihop-csv)
 
 
   Time Formats:
@@ -109,12 +173,31 @@ Arguments:
     <epoch_nsec>
 """
 
+import array
+import asyncio
+import atexit
 import base64
+import codecs
+import collections
+import concurrent.futures
 import csv
 import errno
+import heapq
+import io
+import itertools
+import json
 import logging
+import math
+import mmap
 import os
+import queue
+import select
+import struct
+import tempfile
+import threading
 import traceback
+import weakref
+import zlib
 
 import suds
 from suds import plugin
@@ -135,6 +218,28 @@ import http.client
 import inspect
 from xml.dom import minidom
 
+# optional, for getCsvColumnsInBatches(asNumpy=True) and -F parquet
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+from PcapFile import (GLOBAL_HEADER_LEN, INDEX_SUFFIX, PcapFormatError, PcapIndexBuilder,
+                      PcapSplitter, PcapStreamScanner, readRecords)
+
 VERSION='3.2.0.202206301037-GA+273102'
 
 logging.basicConfig(level=logging.INFO)
@@ -151,13 +256,467 @@ class SudsParameterPlugin(suds.plugin.MessagePlugin):
         fnTag = body[0]
         for k,v in list(self.attrs.items()):
             fnTag.set(k, v)
-        
+
+def readSock1(sock, nbytes):
+    """Handle EINTR in read1, returning whatever is available up to nbytes"""
+    while True:
+        try:
+            data = sock.read1(nbytes)
+        except socket.error as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+        except http.client.IncompleteRead as e:
+            data = e.partial
+        return data
+
+def readSockInto(sock, view):
+    """Handle EINTR in readinto, returning the number of bytes read"""
+    while True:
+        try:
+            return sock.readinto(view)
+        except socket.error as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+        except http.client.IncompleteRead as e:
+            # the partial data has already been copied into view
+            return len(e.partial)
+
+class MtomResponseReader():
+    """
+    Buffered reader for the multipart/related (XOP) framing at the start of
+    an MTOM response. Lines are cut out of large reads with bytes.find rather
+    than being read a byte at a time, and any attachment data that arrived
+    along with the part headers is kept for the data phase.
+    """
+    HEADER_READ_SIZE = 64 * 1024
+
+    def __init__(self, resp):
+        self.resp = resp
+        self.buf = bytearray()
+        self.pos = 0
+        self.scanned = 0
+        self.uuid = None
+        self.xml = None
+
+    def append(self, data):
+        """Add response bytes to the buffer, dropping the consumed lines"""
+        if self.pos:
+            del self.buf[:self.pos]
+            self.pos = 0
+        self.buf += data
+
+    def takeLine(self, maxlen):
+        """Cut the next CRLF terminated line out of the buffer, None if incomplete"""
+        end = self.buf.find(b'\r\n', self.pos + self.scanned)
+        if end < 0:
+            if len(self.buf) - self.pos >= maxlen:
+                raise Exception("line `%s' too long" %
+                                bytes(self.buf[self.pos:self.pos + maxlen]).decode("utf-8").strip())
+            # a CR at the end of the buffer may be the first half of a CRLF
+            self.scanned = max(0, len(self.buf) - self.pos - 1)
+            return None
+        if end + 2 - self.pos >= maxlen:
+            raise Exception("line `%s' too long" %
+                            bytes(self.buf[self.pos:self.pos + maxlen]).decode("utf-8").strip())
+        line = bytes(self.buf[self.pos:end])
+        self.pos = end + 2
+        self.scanned = 0
+        return line
+
+    def takeRest(self, allowPartial):
+        """Return the unterminated line left in the buffer at end of response"""
+        line = bytes(self.buf[self.pos:])
+        self.pos = len(self.buf)
+        self.scanned = 0
+        if allowPartial:
+            return (False, line)
+        raise Exception("getLine failed line=`%s'" % line.decode("utf-8").strip())
+
+    def fill(self):
+        """Append the next available chunk of the response to the buffer"""
+        data = readSock1(self.resp, self.HEADER_READ_SIZE)
+        if not data:
+            return False
+        self.append(data)
+        return True
+
+    def getLine(self, maxlen, allowPartial = False):
+        """Return the next CRLF terminated line, without the CRLF"""
+        while True:
+            line = self.takeLine(maxlen)
+            if line is not None:
+                if allowPartial:
+                    return (True, line)
+                return line
+            if not self.fill():
+                return self.takeRest(allowPartial)
+
+    def headerLine(self, ok, line, maxXmlSize):
+        """
+        Process one line of the UUID, XML part and part headers that precede
+        the attachment data, returning True once the headers are complete.
+        ok is False for the unterminated last line of a response.
+        """
+        if self.uuid is None:
+            if not ok:
+                raise Exception("getLine failed line=`%s'" % line.decode("utf-8").strip())
+            self.uuid = line
+            self.xml = b''
+            return False
+        if self.xml is not None:
+            if not ok:
+                # Handle error responses
+                xml = self.xml
+                if line == (b'%s--' % self.uuid):
+                    errHdrEndPos = xml.find("\n\n".encode("utf-8"))
+                    if errHdrEndPos >= 0:
+                        xml = xml[errHdrEndPos + 2:]
+                    try:
+                        xml = minidom.parseString(xml.decode("utf-8")).toprettyxml(indent="  ").encode("utf-8")
+                    except Exception as e:
+                        pass
+                    raise Exception(xml.decode("utf-8"))
+                raise Exception("getLine failed - line is: (%s)" % line.decode("utf-8"))
+            if line == self.uuid:
+                self.xml = None
+                return False
+            self.xml += line + "\n".encode("utf-8")
+            if len(self.xml) > maxXmlSize:
+                raise Exception("xml `%s' too large" % self.xml.decode("utf-8"))
+            return False
+        if not ok:
+            raise Exception("getLine failed line=`%s'" % line.decode("utf-8").strip())
+        return line == b''
+
+    def readHeaders(self, maxXmlSize):
+        """Read the UUID, XML + headers, returning the data end marker"""
+        while not self.headerLine(*self.getLine(maxXmlSize, allowPartial = True), maxXmlSize = maxXmlSize):
+            pass
+        return b'\r\n%s--' % self.uuid
+
+    def drain(self, maxSize):
+        """
+        Read the response to its end, discarding up to maxSize bytes, and
+        return True if the end was reached
+        """
+        drained = len(self.buf) - self.pos
+        self.buf = bytearray()
+        self.pos = 0
+        while drained <= maxSize:
+            data = readSock1(self.resp, self.HEADER_READ_SIZE)
+            if not data:
+                return True
+            drained += len(data)
+        return False
+
+    def getDataBlocks(self, endMarker, blockSize):
+        """
+        Yield the attachment data, up to endMarker, as memoryview slices of
+        one preallocated buffer that is refilled with readinto(). Only the
+        tail of each block is compared against the end marker, and only the
+        marker-sized tail is moved before the next read, so the data is not
+        copied on its way through. Each slice is only valid until the next
+        one is requested.
+        """
+        markerLen = len(endMarker)
+        held = len(self.buf) - self.pos
+        buf = bytearray(max(blockSize, held) + markerLen)
+        view = memoryview(buf)
+        view[:held] = self.buf[self.pos:]
+        self.buf = bytearray()
+        self.pos = 0
+        while True:
+            if held >= markerLen and view[held - markerLen:held] == endMarker:
+                if held > markerLen:
+                    yield view[:held - markerLen]
+                return
+            if held > markerLen:
+                yield view[:held - markerLen]
+                view[:markerLen] = view[held - markerLen:held]
+                held = markerLen
+            n = readSockInto(self.resp, view[held:])
+            if not n:
+                raise Exception("Missing end marker")
+            held += n
+
+class StreamMetrics():
+    """
+    Timings of one MTOM stream, in seconds from when its request was
+    started: connecting (0 on a reused keep-alive connection), sending
+    the request, the HTTP response headers and the first attachment data
+    arriving, which together tell a slow CNE query from a slow transfer;
+    then the data bytes and blocks received, the time spent waiting for
+    blocks after the first (stalls) and the overall rate.
+    """
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self.reused = False
+        self.connectSeconds = 0.0
+        self.sendSeconds = 0.0
+        self.firstHeaderSeconds = None
+        self.firstDataSeconds = None
+        self.bytes = 0
+        self.blocks = 0
+        self.stallSeconds = 0.0
+
+    def finish(self):
+        if self.start is not None and self.end is None:
+            self.end = time.perf_counter()
+
+    @property
+    def elapsedSeconds(self):
+        if self.start is None:
+            return 0.0
+        return (self.end or time.perf_counter()) - self.start
+
+    @property
+    def mbPerSecond(self):
+        elapsed = self.elapsedSeconds
+        return self.bytes / elapsed / 1e6 if elapsed else 0.0
+
+    def __str__(self):
+        def seconds(value):
+            return "-" if value is None else "%.3fs" % value
+        return ("connect %s%s, send %s, first header %s, first data %s, %d bytes in %d blocks, "
+                "stalled %.3fs, %.3fs at %.2f MB/s" %
+                (seconds(self.connectSeconds), " (reused)" if self.reused else "", seconds(self.sendSeconds),
+                 seconds(self.firstHeaderSeconds), seconds(self.firstDataSeconds), self.bytes, self.blocks,
+                 self.stallSeconds, self.elapsedSeconds, self.mbPerSecond))
+
+class StreamMetricsLog():
+    """
+    The StreamMetrics of a client's streams: the most recent KEEP of them,
+    and totals over all of them, so that a long run of streams, such as a
+    --batch of lookups, does not grow it without bound
+    """
+    KEEP = 100
+
+    def __init__(self, keep=KEEP):
+        self.keep = keep
+        self.recent = collections.deque()
+        self.lock = threading.Lock()
+        self.streams = 0
+        self.droppedBytes = 0
+        self.droppedEnd = None
+        self.start = None
+
+    def add(self, metrics):
+        with self.lock:
+            self.streams += 1
+            self.recent.append(metrics)
+            if len(self.recent) > self.keep:
+                dropped = self.recent.popleft()
+                self.droppedBytes += dropped.bytes
+                if dropped.start is not None:
+                    end = dropped.end or time.perf_counter()
+                    self.start = dropped.start if self.start is None else min(self.start, dropped.start)
+                    self.droppedEnd = end if self.droppedEnd is None else max(self.droppedEnd, end)
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.recent))
+
+    def __len__(self):
+        return len(self.recent)
+
+    def totals(self):
+        """(streams, bytes, elapsed seconds from the first start to the last end) over all the streams"""
+        with self.lock:
+            recent = list(self.recent)
+            started = [stream.start for stream in recent if stream.start is not None]
+            ended = [stream.end or time.perf_counter() for stream in recent if stream.start is not None]
+            if self.start is not None:
+                started.append(self.start)
+                ended.append(self.droppedEnd)
+            elapsed = max(ended) - min(started) if started else 0.0
+            return (self.streams, self.droppedBytes + sum(stream.bytes for stream in recent), elapsed)
+
+class MtomBlockStream():
+    """
+    The blocks of an MTOM response, read by the generator that
+    getXmlMtomResponseInBlocks returns, with the StreamMetrics of the
+    stream kept up to date in metrics as it is read
+    """
+    def __init__(self, client, requestXml, zeroCopy):
+        self.metrics = StreamMetrics()
+        self.blocks = client.readXmlMtomResponseInBlocks(requestXml, zeroCopy, self.metrics)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        metrics = self.metrics
+        start = time.perf_counter()
+        try:
+            block = next(self.blocks)
+        except StopIteration:
+            metrics.finish()
+            raise
+        if metrics.blocks:
+            metrics.stallSeconds += time.perf_counter() - start
+        metrics.blocks += 1
+        metrics.bytes += len(block)
+        return block
+
+    def close(self):
+        self.blocks.close()
+        self.metrics.finish()
+
+class PrefetchStats():
+    """
+    Where the time of a prefetched stream went. Time the reader spends
+    blocked on a full ring is time the consumer (processing or the disk)
+    was the bottleneck; time the consumer spends blocked on an empty ring
+    is time the CNE or the network was.
+    """
+    def __init__(self, ringBlocks=0):
+        self.ringBlocks = ringBlocks
+        self.blocks = 0
+        self.bytes = 0
+        self.highWater = 0
+        self.readSeconds = 0.0
+        self.readerBlockedSeconds = 0.0
+        self.consumerBlockedSeconds = 0.0
+
+    def add(self, other):
+        self.ringBlocks = max(self.ringBlocks, other.ringBlocks)
+        self.blocks += other.blocks
+        self.bytes += other.bytes
+        self.highWater = max(self.highWater, other.highWater)
+        self.readSeconds += other.readSeconds
+        self.readerBlockedSeconds += other.readerBlockedSeconds
+        self.consumerBlockedSeconds += other.consumerBlockedSeconds
+
+    def __str__(self):
+        return ("%d blocks, %d bytes; ring high water %d of %d blocks; reader %.3fs reading, "
+                "%.3fs blocked on a full ring; consumer %.3fs blocked on an empty ring" %
+                (self.blocks, self.bytes, self.highWater, self.ringBlocks, self.readSeconds,
+                 self.readerBlockedSeconds, self.consumerBlockedSeconds))
+
+class BlockPrefetcher():
+    """
+    Runs a block stream on a reader thread that copies the blocks into a
+    bounded ring of buffers, so the network keeps being read while the
+    consumer works on the previous blocks, and a slow consumer only holds
+    up the reader once the ring is full. Iterating yields views of the
+    ring buffers, each valid until the next block is taken (or bytes
+    copies without zeroCopy). The reader thread is started by the first
+    block taken, so the request is not sent before then.
+
+    close(), or dropping the prefetcher part way through the stream,
+    stops the reader thread, which then closes the stream and with it the
+    connection. onDone, if given, is called once with the PrefetchStats
+    when the stream ends or is stopped.
+    """
+    RING_BLOCKS = 8
+
+    def __init__(self, dataGen, ringBlocks=RING_BLOCKS, zeroCopy=True, onDone=None):
+        self.dataGen = dataGen
+        self.metrics = getattr(dataGen, 'metrics', None)
+        self.zeroCopy = zeroCopy
+        self.ring = [bytearray() for _ in range(ringBlocks)]
+        self.free = queue.Queue()
+        for slot in range(ringBlocks):
+            self.free.put(slot)
+        self.filled = queue.Queue()
+        self.stats = PrefetchStats(ringBlocks)
+        self.stopped = threading.Event()
+        self.thread = None
+        self.current = None
+        self.done = False
+        # the reader thread holds no reference to the prefetcher, so this
+        # also runs when the consumer drops it without closing it
+        self.finalizer = weakref.finalize(self, BlockPrefetcher.stop, self.stopped, self.free,
+                                          self.stats, onDone)
+
+    @staticmethod
+    def stop(stopped, free, stats, onDone):
+        stopped.set()
+        # wake the reader if it is waiting for a free buffer
+        free.put(None)
+        if onDone is not None:
+            onDone(stats)
+
+    @staticmethod
+    def readAhead(dataGen, ring, free, filled, stats, stopped):
+        try:
+            blocks = iter(dataGen)
+            while not stopped.is_set():
+                start = time.perf_counter()
+                block = next(blocks, None)
+                read = time.perf_counter()
+                stats.readSeconds += read - start
+                if block is None:
+                    break
+                slot = free.get()
+                stats.readerBlockedSeconds += time.perf_counter() - read
+                if stopped.is_set():
+                    return
+                size = len(block)
+                if len(ring[slot]) < size:
+                    # the consumer may still hold a view of the old buffer, so it is replaced, not resized
+                    ring[slot] = bytearray(size)
+                ring[slot][:size] = block
+                filled.put((slot, size))
+                stats.highWater = max(stats.highWater, filled.qsize())
+            filled.put((None, None))
+        except BaseException as e:
+            filled.put((None, e))
+        finally:
+            if hasattr(dataGen, 'close'):
+                dataGen.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.current is not None:
+            self.free.put(self.current)
+            self.current = None
+        if self.done:
+            raise StopIteration
+        if self.thread is None:
+            self.thread = threading.Thread(target=BlockPrefetcher.readAhead, name='BlockPrefetcher', daemon=True,
+                                           args=(self.dataGen, self.ring, self.free, self.filled, self.stats,
+                                                 self.stopped))
+            self.thread.start()
+        start = time.perf_counter()
+        slot, size = self.filled.get()
+        self.stats.consumerBlockedSeconds += time.perf_counter() - start
+        if slot is None:
+            self.done = True
+            self.finalizer()
+            if size is not None:
+                raise size
+            raise StopIteration
+        self.current = slot
+        self.stats.blocks += 1
+        self.stats.bytes += size
+        view = memoryview(self.ring[slot])[:size]
+        return view if self.zeroCopy else bytes(view)
+
+    def close(self):
+        """Stop the stream early; the reader thread closes it after the block it is reading"""
+        if self.done:
+            return
+        self.done = True
+        if self.thread is None and hasattr(self.dataGen, 'close'):
+            self.dataGen.close()
+        self.finalizer()
+
 class CorvilApiMtomClient():
     READ_BLOCK_SIZE = 1024 * 1024
     MAX_XML_SIZE = 64 * 1024
+    CSV_BATCH_ROWS = 10000
     SOCKET_TIMEOUT_SECONDS = 3600
+    MAX_IDLE_CONNECTIONS = 8
+    MAX_DRAIN_SIZE = 64 * 1024
 
-    def __init__(self, host, port = 5101, username = 'admin', password = '', cne=None, useHttps=False, timeout=SOCKET_TIMEOUT_SECONDS):
+    def __init__(self, host, port = 5101, username = 'admin', password = '', cne=None, useHttps=False, timeout=SOCKET_TIMEOUT_SECONDS,
+                 zeroCopy=False, prefetchBlocks=0):
         self.host = host
         self.port = port
         self.username = username
@@ -168,9 +727,26 @@ class CorvilApiMtomClient():
         if self.useHttps:
             self.url = "https://%s/api/ws/statsMTOM-v2?wsdl" % (host)
         self.timeout = timeout
-
-        # suds plugin
+        # when set, the *InBlocks generators yield memoryviews into a reused
+        # buffer instead of bytes, see getXmlMtomResponseInBlocks
+        self.zeroCopy = zeroCopy
+        # when set, the responses are read ahead into a ring of that many
+        # blocks on a reader thread, see BlockPrefetcher
+        self.prefetchBlocks = prefetchBlocks
+        # PrefetchStats summed over the prefetched streams as they finish
+        self.prefetchStats = PrefetchStats()
+        self.prefetchStatsLock = threading.Lock()
+        # StreamMetrics of the streams, see getXmlMtomResponseInBlocks
+        self.streamMetrics = StreamMetricsLog()
+
+        # idle keep-alive connections by (scheme, host, port), see getConnection
+        self.connectionPool = {}
+        self.connectionPoolLock = threading.Lock()
+
+        # suds plugin, and the lock held while it and the suds client are
+        # used to build a request, see buildRequestEnvelope
         self.paramPlugin = SudsParameterPlugin()
+        self.requestLock = threading.RLock()
         
         # we're going to do a 'nosend' for the MTOM client as SUDs doesn't
         # support MTOM, so we basically use SUDS to assemble the XML and then
@@ -194,6 +770,48 @@ class CorvilApiMtomClient():
         
 
     # Various helper methods
+    def buildRequestEnvelope(self, params, operation, *args):
+        """
+        Build the SOAP envelope of an MTOM request with the extra method
+        parameters. The suds client and its parameter plugin are shared by
+        every stream of this client, so requests are built one at a time,
+        leaving the streams themselves free to run on any number of threads.
+        """
+        with self.requestLock:
+            self.paramPlugin.setAttrs(params)
+            return getattr(self.client.service, operation)(*args).envelope
+
+    def getCnes(self):
+        """Return the names of the CNEs configured on a CMC"""
+        # getCnes is on the StatsPort, see MtomTool.get_mp_list
+        with self.requestLock:
+            self.client.set_options(port = "StatsPort", nosend = False)
+            self.paramPlugin.setAttrs({})
+            try:
+                response = self.client.service.getCnes()
+            finally:
+                self.client.set_options(port = "StatsMtomPort", nosend = True)
+        return [cne._name for cne in response]
+
+    def getMeasurementPointNames(self, period="1-hour", params={}):
+        """
+        Return the set of channel, interface and class names in the summary
+        of the reporting period, as listed by mp-list
+        """
+        # getSummary is on the StatsPort, see MtomTool.get_mp_list
+        with self.requestLock:
+            self.client.set_options(port = "StatsPort", nosend = False)
+            self.paramPlugin.setAttrs(dict(params, version = '2'))
+            try:
+                summary = self.client.service.getSummary("", self.createObject("ns0:ReportingPeriod")[period])
+            finally:
+                self.client.set_options(port = "StatsMtomPort", nosend = True)
+        names = set()
+        for mp in getattr(summary, "channel", []) + getattr(summary, "interface", []):
+            names.add(mp._name)
+            names.update(cls._name for cls in mp.cls)
+        return names
+
     def getSudsClient(self):
         """Return the suds client"""
         return self.client
@@ -264,48 +882,136 @@ class CorvilApiMtomClient():
         view._name = viewName
         return view
 
-    def getXmlMtomResponseInBlocks(self, requestXml):
+    def connectionKey(self):
+        if self.useHttps:
+            return ('https', self.host, 443)
+        return ('http', self.host, int(self.port))
+
+    def getConnection(self):
+        """
+        Return (connection, reused): an idle keep-alive connection from the
+        pool if there is a live one, otherwise a new connection
+        """
+        key = self.connectionKey()
+        while True:
+            with self.connectionPoolLock:
+                idle = self.connectionPool.get(key)
+                conn = idle.pop() if idle else None
+            if conn is None:
+                break
+            # an idle connection has nothing to read unless the server has
+            # closed it (or sent something unexpected), either way it is stale
+            try:
+                stale = conn.sock is None or select.select([conn.sock], [], [], 0)[0]
+            except (OSError, ValueError):
+                stale = True
+            if not stale:
+                return (conn, True)
+            conn.close()
+        return (self.newConnection(), False)
+
+    def newConnection(self):
+        if self.useHttps:
+            return http.client.HTTPSConnection(self.host, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def releaseConnection(self, conn, resp):
+        """Return a connection to the pool if its response has been read to the end"""
+        if resp.isclosed() and not resp.will_close and conn.sock is not None:
+            with self.connectionPoolLock:
+                idle = self.connectionPool.setdefault(self.connectionKey(), [])
+                if len(idle) < self.MAX_IDLE_CONNECTIONS:
+                    idle.append(conn)
+                    return
+        conn.close()
+
+    def close(self):
+        """Close the pooled keep-alive connections"""
+        with self.connectionPoolLock:
+            pool, self.connectionPool = self.connectionPool, {}
+        for idle in pool.values():
+            for conn in idle:
+                conn.close()
+
+    def sendRequest(self, requestXml, headers, metrics):
+        """
+        POST the request, on a pooled connection where possible, returning
+        (connection, response). If sending on a pooled connection fails
+        because the server has closed it, the request is sent again on a
+        new connection. Once the request has been sent it may have reached
+        the server, so a failure reading the response is raised.
+        """
+        conn, reused = self.getConnection()
+        metrics.reused = reused
+        try:
+            try:
+                self.postRequest(conn, requestXml, headers, metrics)
+            except (BrokenPipeError, ConnectionResetError, http.client.CannotSendRequest):
+                if not reused:
+                    raise
+                conn.close()
+                conn = self.newConnection()
+                metrics.reused = False
+                self.postRequest(conn, requestXml, headers, metrics)
+            resp = conn.getresponse()
+        except BaseException:
+            conn.close()
+            raise
+        metrics.firstHeaderSeconds = time.perf_counter() - metrics.start
+        return (conn, resp)
+
+    def postRequest(self, conn, requestXml, headers, metrics):
+        """POST the request on conn, timing it into metrics"""
+        start = time.perf_counter()
+        if conn.sock is None:
+            conn.connect()
+        connected = time.perf_counter()
+        conn.request("POST", self.url, body = requestXml, headers = headers)
+        metrics.connectSeconds = connected - start
+        metrics.sendSeconds = time.perf_counter() - connected
+
+    def getXmlMtomResponseInBlocks(self, requestXml, zeroCopy=None):
         """
            Sent the specified request in a POST request, and return
            a python generator that streams back the response
+
+           With zeroCopy (default: the client's zeroCopy setting) the blocks
+           are memoryviews into a buffer that is reused for the next block,
+           so they must be consumed (or copied) before advancing the
+           generator. Otherwise each block is a bytes copy.
+
+           The request and transfer are timed in a StreamMetrics, kept in
+           the client's streamMetrics (see StreamMetricsLog).
+
+           With the client's prefetchBlocks set the response is read ahead
+           on a reader thread by a BlockPrefetcher, whose stats are added to
+           the client's prefetchStats when it finishes.
         """
+        if zeroCopy is None:
+            zeroCopy = self.zeroCopy
+        if self.prefetchBlocks:
+            stream = MtomBlockStream(self, requestXml, True)
+            blocks = BlockPrefetcher(stream, self.prefetchBlocks, zeroCopy, self.addPrefetchStats)
+        else:
+            stream = blocks = MtomBlockStream(self, requestXml, zeroCopy)
+        self.streamMetrics.add(stream.metrics)
+        return self.yieldBlocks(blocks)
 
-        def patch_http_response_read(func):
-            def inner(*args):
-                try:
-                    return func(*args)
-                except http.client.IncompleteRead as e:
-                    return e.partial
+    @staticmethod
+    def yieldBlocks(blocks):
+        """The generator returned by getXmlMtomResponseInBlocks, closing blocks when it is closed"""
+        try:
+            for block in blocks:
+                yield block
+        finally:
+            blocks.close()
 
-            return inner
+    def addPrefetchStats(self, stats):
+        with self.prefetchStatsLock:
+            self.prefetchStats.add(stats)
 
-        def readSock(sock, nbytes):
-            """Handle EINTR in read"""
-            while True:
-                try:
-                    data = sock.read(nbytes)
-                except socket.error as e:
-                    if e.args[0] == errno.EINTR:
-                        continue
-                    raise
-                return data
-
-        def getLine(resp, maxlen = self.MAX_XML_SIZE, allowPartial = False):
-            """Read a line character by character from a response"""
-            line = b''
-            while len(line) < maxlen and (len(line) < 2 or line[-2:] != b'\r\n'):
-                c = readSock(resp, 1)
-                if not c:
-                    if allowPartial:
-                        return (False, line)
-                    raise Exception("getLine failed line=`%s'" % line.decode("utf-8").strip())
-                line += c
-            if len(line) >= maxlen:
-                raise Exception("line `%s' too long" % line.decode("utf-8").strip())
-            line = line[:-2]
-            if allowPartial:
-                return (True, line)
-            return line
+    def readXmlMtomResponseInBlocks(self, requestXml, zeroCopy, metrics):
+        """The generator of getXmlMtomResponseInBlocks, timing the stream into metrics"""
 
         headers = {
             'Accept' : 'application/xop+xml',
@@ -314,97 +1020,58 @@ class CorvilApiMtomClient():
                 (self.username, self.password)).encode('utf-8')).decode('utf-8')[:-1],
         }
 
-        if self.useHttps:
-            conn = http.client.HTTPSConnection(self.host, timeout=self.timeout)
-        else:
-            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
-                    
-        conn.request("POST", self.url, body = requestXml, headers = headers)
-        start_time = time.time()
-        resp = conn.getresponse()
-
-        original_read = http.client.HTTPResponse.read
-        http.client.HTTPResponse.read = patch_http_response_read(http.client.HTTPResponse.read)
+        metrics.start = time.perf_counter()
+        conn, resp = self.sendRequest(requestXml, headers, metrics)
 
         try:
-            # Read the UUID, XML + headers
-            uuid = getLine(resp)
-            xml = b''
-            while True:
-                (ok, l) = getLine(resp, allowPartial = True)
-                if not ok:
-                    # Handle error responses
-                    if l == (b'%s--' % uuid):
-                        errHdrEndPos = xml.find("\n\n".encode("utf-8"))
-                        if errHdrEndPos >= 0:
-                            xml = xml[errHdrEndPos + 2:]
-                        try:
-                            xml = minidom.parseString(xml.decode("utf-8")).toprettyxml(indent="  ").encode("utf-8")
-                        except Exception as e:
-                            pass
-                        raise Exception(xml.decode("utf-8"))
-                    raise Exception("getLine failed - line is: (%s)" % l.decode("utf-8"))
-                if l == uuid:
-                    break
-                xml += l + "\n".encode("utf-8")
-                if len(xml) > self.MAX_XML_SIZE:
-                    raise Exception("xml `%s' too large" % xml.decode("utf-8"))
-            while True:
-                l = getLine(resp)
-                if l == b'':
-                    break
-
-            # Now stream back the data, checking for the UUID end marker
-            endMarker = b'\r\n%s--' % uuid
-            dat = b''
-            while True:
-                newDat = readSock(resp, self.READ_BLOCK_SIZE)
-                if not newDat or len(dat) + len(newDat) < len(endMarker):
-                    raise Exception("Missing end marker")
-                dat += newDat
-                if len(dat) > len(endMarker):
-                     yield dat[:-len(endMarker)]
-                dat = dat[-len(endMarker):]
-                if dat == endMarker:
-                    break
+            # Read the UUID, XML + headers, then stream back the data,
+            # checking for the UUID end marker. The header reads will
+            # usually have pulled in the start of the data.
+            reader = MtomResponseReader(resp)
+            endMarker = reader.readHeaders(self.MAX_XML_SIZE)
+            for block in reader.getDataBlocks(endMarker, self.READ_BLOCK_SIZE):
+                if metrics.firstDataSeconds is None:
+                    metrics.firstDataSeconds = time.perf_counter() - metrics.start
+                if zeroCopy:
+                    yield block
+                else:
+                    yield bytes(block)
+            # read the end of the HTTP body so the connection can be reused
+            if reader.drain(self.MAX_DRAIN_SIZE):
+                self.releaseConnection(conn, resp)
+                conn = None
         finally:
-            http.client.HTTPResponse.read = original_read
+            if conn is not None:
+                conn.close()
 
     def getPcapInBlocks(self, mpReq, timeRange, filters, extraMps = [], params = {}):
-        self.paramPlugin.setAttrs(params)
-        requestSOAP = self.client.service.getPcap(mpReq, timeRange, filters, extraMps)
-        return self.getXmlMtomResponseInBlocks(requestSOAP.envelope)
+        envelope = self.buildRequestEnvelope(params, "getPcap", mpReq, timeRange, filters, extraMps)
+        return self.getXmlMtomResponseInBlocks(envelope)
     
     def getMessageGapCsvInBlocks(self, mpReq, timeRange, filters, params = {}):
-        self.paramPlugin.setAttrs(params)
-        requestSOAP = self.client.service.getMessageGapCsv(mpReq, timeRange, filters)
-        return self.getXmlMtomResponseInBlocks(requestSOAP.envelope)
+        envelope = self.buildRequestEnvelope(params, "getMessageGapCsv", mpReq, timeRange, filters)
+        return self.getXmlMtomResponseInBlocks(envelope)
     
     def getMultihopCsvInBlocks(self, mpReq, messageId,params={}):
-        self.paramPlugin.setAttrs(params)
-        requestSOAP = self.client.service.getMessageMultiHopCsv(mpReq, messageId)
-        return self.getXmlMtomResponseInBlocks(requestSOAP.envelope)
+        envelope = self.buildRequestEnvelope(params, "getMessageMultiHopCsv", mpReq, messageId)
+        return self.getXmlMtomResponseInBlocks(envelope)
 
     def getMessageCsvInBlocks(self, mpReq, timeRange, filters, params = {}):
-        self.paramPlugin.setAttrs(params)
-        requestSOAP  = self.client.service.getMessageCsv(mpReq, timeRange, filters)
-        return self.getXmlMtomResponseInBlocks(requestSOAP.envelope)
+        envelope = self.buildRequestEnvelope(params, "getMessageCsv", mpReq, timeRange, filters)
+        return self.getXmlMtomResponseInBlocks(envelope)
 
     def getPacketCsvInBlocks(self, mpReq, timeRange, filters, params = {}):
-        self.paramPlugin.setAttrs(params)
-        requestSOAP = self.client.service.getPacketCsv(mpReq, timeRange, filters)
-        return self.getXmlMtomResponseInBlocks(requestSOAP.envelope)
+        envelope = self.buildRequestEnvelope(params, "getPacketCsv", mpReq, timeRange, filters)
+        return self.getXmlMtomResponseInBlocks(envelope)
 
     def getLensCsvInBlocks(self, rp, view, params = {}):
-        self.paramPlugin.setAttrs(params)
-        requestSOAP = self.client.service.getLensCsv(rp, view)
-        return self.getXmlMtomResponseInBlocks(requestSOAP.envelope)
+        envelope = self.buildRequestEnvelope(params, "getLensCsv", rp, view)
+        return self.getXmlMtomResponseInBlocks(envelope)
 
     def getFlowTableCsvInBlocks(self, timeRange, query, aggregation,
                                 summariesOnly, params={}):
-        self.paramPlugin.setAttrs(params)
-        requestSOAP = self.client.service.getFlowTableCsv(timeRange, query, aggregation,summariesOnly)
-        return self.getXmlMtomResponseInBlocks(requestSOAP.envelope)
+        envelope = self.buildRequestEnvelope(params, "getFlowTableCsv", timeRange, query, aggregation, summariesOnly)
+        return self.getXmlMtomResponseInBlocks(envelope)
 
     def getFlowTableCsvInLineArray(self, csv_generator):
         """Creates a generator object to stream back a CSV row by row.
@@ -413,46 +1080,1155 @@ class CorvilApiMtomClient():
             csv_generator (generator): A generator object that creates a CSV.
 
         Returns:
-            generator: The generator that will stream the CSV row by row.
+            generator: The generator that will stream the CSV as lists of
+                lines, one list per block with a newline in it. A line that
+                straddles blocks is in the list of the block it ends in, and
+                a last line without a newline comes in a list of its own.
         """
-
-        keep = ""
+        keep = b""
         try:
             for block in csv_generator:
-                # Add any partial row from prior pass to this data chunk.
-                kept = keep + block.decode("utf-8")
-
-                # Make sure the data chunk contains at least one whole row.
-                if "\n" not in kept:
-                    keep = kept
+                view = memoryview(block)
+                last = findByte(view, b"\n", reverse=True)
+                if last < 0:
+                    keep += view
                     continue
+                # cut at a newline byte, so no UTF-8 character is split
+                text = str(keep + view[:last + 1] if keep else view[:last + 1], "utf-8")
+                keep = bytes(view[last + 1:])
+                yield text.splitlines()
+            if keep:
+                yield str(keep, "utf-8").splitlines()
+        finally:
+            csv_generator.close()
 
-                # Separate the last row from the main chunk.
-                # Will remove and partial row and use it next pass.
-                # If it's a complete row, no harm done.
-                block_and_last_row = kept.rsplit("\n", 1)
+    def getCsvRowsInBatches(self, csv_generator, batchSize=CSV_BATCH_ROWS):
+        """Creates a generator object to stream back a CSV as parsed rows.
 
-                full_block = block_and_last_row[0]
-                potential_partial = ""
+        Works on the generator returned by any of the *CsvInBlocks methods.
+        Characters and quoted fields that straddle blocks are handled, and
+        memory use stays constant however large the CSV is.
 
-                if len(block_and_last_row) > 1:
-                    potential_partial = block_and_last_row[1]
+        Args:
+            csv_generator (generator): A generator object that creates a CSV.
+            batchSize (int): Number of rows per batch.
+
+        Returns:
+            generator: The generator that will stream lists of up to
+                batchSize rows, each row a list of str as from csv.reader.
+        """
+        lines = itertools.chain.from_iterable(io.StringIO(text, newline="\n")
+                                              for text in self.getCsvTextInBlocks(csv_generator))
+        reader = csv.reader(lines)
+        while True:
+            batch = list(itertools.islice(reader, batchSize))
+            if not batch:
+                break
+            yield batch
+
+    def getCsvColumnsInBatches(self, csv_generator, batchSize=CSV_BATCH_ROWS, asNumpy=False):
+        """Creates a generator object to stream back a CSV as typed columns.
 
-                # Parse the full block into CSV rows,
-                # store any partial information for next pass.
-                lines = full_block.splitlines()
-                keep = potential_partial
-                yield lines
-        except Exception as exception:
-            raise exception
+        The first row is taken as the header, and each column's type comes
+        from its name (see csvColumnType): timestamps become int64 epoch
+        nanoseconds with a validity mask (see TimestampColumn), latencies
+        float64 (NaN where empty) and everything else stays str.
+
+        Args:
+            csv_generator (generator): A generator object that creates a CSV.
+            batchSize (int): Number of rows per batch.
+            asNumpy (bool): Return the typed columns as numpy arrays, which
+                share the memory of the array.array columns, the timestamps
+                as masked arrays.
+
+        Returns:
+            generator: The generator that will stream dicts, in header
+                order, of column name to TimestampColumn, array('d') or list
+                of str, for up to batchSize rows at a time.
+        """
+        if asNumpy and numpy is None:
+            raise Exception("asNumpy needs the numpy package")
+        header = None
+        for batch in self.getCsvRowsInBatches(csv_generator, batchSize):
+            if header is None:
+                header = batch[0]
+                types = [csvColumnType(name) for name in header]
+                batch = batch[1:]
+                if not batch:
+                    continue
+            columns = {}
+            for name, typecode, values in zip(header, types, itertools.zip_longest(*batch, fillvalue='')):
+                if typecode == 'q':
+                    column = TimestampColumn.fromFields(values)
+                elif typecode == 'd':
+                    column = array.array('d', map(csvFloat, values))
+                else:
+                    column = list(values)
+                if asNumpy and typecode == 'q':
+                    column = numpy.ma.masked_array(numpy.frombuffer(column, dtype=numpy.int64),
+                                                   mask=numpy.frombuffer(column.valid, dtype=numpy.uint8) == 0)
+                elif asNumpy and typecode:
+                    column = numpy.frombuffer(column, dtype=numpy.float64)
+                columns[name] = column
+            yield columns
+
+    def getCsvTextInBlocks(self, csv_generator):
+        """Creates a generator object to stream back a CSV as text.
+
+        Each block is cut at its first and last newline bytes, which in
+        UTF-8 are never part of a multi-byte character. The lines between
+        them are decoded straight from the block, and only the partial line
+        at its end is kept, as bytes, to be decoded with the start of the
+        next block, so every piece yielded is whole lines.
+
+        Args:
+            csv_generator (generator): A generator object that creates a CSV.
+
+        Returns:
+            generator: The generator that will stream str blocks of whole lines.
+        """
+        keep = b""
+        try:
+            for block in csv_generator:
+                view = memoryview(block)
+                last = findByte(view, b"\n", reverse=True)
+                if last < 0:
+                    keep += view
+                    continue
+                start = 0
+                if keep:
+                    start = findByte(view, b"\n") + 1
+                    yield str(keep + view[:start], "utf-8")
+                if last + 1 > start:
+                    yield str(view[start:last + 1], "utf-8")
+                keep = bytes(view[last + 1:])
+            if keep:
+                yield str(keep, "utf-8")
         finally:
             csv_generator.close()
 
 
+class AsyncHttpBody():
+    """
+    Minimal HTTP/1.1 response body decoder over an asyncio StreamReader,
+    handling chunked, Content-Length and read-to-close bodies. read() returns
+    whatever is available up to n bytes, and b'' at the end of the body; a
+    body cut short ends early rather than raising, as with readSock1.
+    """
+    def __init__(self, reader, headers, timeout):
+        self.reader = reader
+        self.timeout = timeout
+        self.chunked = 'chunked' in headers.get('transfer-encoding', '').lower()
+        self.remaining = None
+        if not self.chunked and 'content-length' in headers:
+            self.remaining = int(headers['content-length'])
+        self.chunkLeft = 0
+        self.done = False
+
+    async def readline(self):
+        return await asyncio.wait_for(self.reader.readline(), self.timeout)
+
+    async def read(self, n):
+        if self.done:
+            return b''
+        if self.chunked:
+            if self.chunkLeft == 0:
+                line = await self.readline()
+                try:
+                    self.chunkLeft = int(line.split(b';', 1)[0].strip(), 16)
+                except ValueError:
+                    self.done = True
+                    return b''
+                if self.chunkLeft == 0:
+                    # skip any trailers
+                    while line.strip():
+                        line = await self.readline()
+                    self.done = True
+                    return b''
+            n = min(n, self.chunkLeft)
+        elif self.remaining is not None:
+            n = min(n, self.remaining)
+            if n == 0:
+                self.done = True
+                return b''
+        data = await asyncio.wait_for(self.reader.read(n), self.timeout)
+        if not data:
+            self.done = True
+            return b''
+        if self.chunked:
+            self.chunkLeft -= len(data)
+            if self.chunkLeft == 0:
+                await self.readline()
+        elif self.remaining is not None:
+            self.remaining -= len(data)
+        return data
+
+class AsyncMtomResponseReader(MtomResponseReader):
+    """MtomResponseReader over an AsyncHttpBody, for AsyncCorvilApiMtomClient"""
+    async def fillAsync(self):
+        data = await self.resp.read(self.HEADER_READ_SIZE)
+        if not data:
+            return False
+        self.append(data)
+        return True
+
+    async def getLineAsync(self, maxlen, allowPartial = False):
+        while True:
+            line = self.takeLine(maxlen)
+            if line is not None:
+                if allowPartial:
+                    return (True, line)
+                return line
+            if not await self.fillAsync():
+                return self.takeRest(allowPartial)
+
+    async def readHeadersAsync(self, maxXmlSize):
+        while not self.headerLine(*await self.getLineAsync(maxXmlSize, allowPartial = True),
+                                  maxXmlSize = maxXmlSize):
+            pass
+        return b'\r\n%s--' % self.uuid
+
+    async def getDataBlocksAsync(self, endMarker, blockSize):
+        """
+        Yield the attachment data up to endMarker as memoryview slices of
+        one preallocated buffer, as getDataBlocks does. The stream reader
+        hands over bytes, which are copied into the buffer after the held
+        marker-sized tail. Each slice is only valid until the next one is
+        requested.
+        """
+        markerLen = len(endMarker)
+        held = len(self.buf) - self.pos
+        buf = bytearray(max(blockSize, held) + markerLen)
+        view = memoryview(buf)
+        view[:held] = self.buf[self.pos:]
+        self.buf = bytearray()
+        self.pos = 0
+        while True:
+            if held >= markerLen and view[held - markerLen:held] == endMarker:
+                if held > markerLen:
+                    yield view[:held - markerLen]
+                return
+            if held > markerLen:
+                yield view[:held - markerLen]
+                view[:markerLen] = view[held - markerLen:held]
+                held = markerLen
+            data = await self.resp.read(len(view) - held)
+            if not data:
+                raise Exception("Missing end marker")
+            view[held:held + len(data)] = data
+            held += len(data)
+
+class AsyncCorvilApiMtomClient(CorvilApiMtomClient):
+    """
+    asyncio sibling of CorvilApiMtomClient. Requests are still assembled by
+    suds in nosend mode, but are sent over asyncio streams and the response
+    is parsed per connection, with no global state, so one event loop can
+    drive many concurrent streams, e.g.
+
+        async def fetch(client, mp, fromNs, toNs, out):
+            mpReq = client.createMeasurementPointRequest(mp)
+            timeRange = client.createTimeRangeNs(fromNs, toNs)
+            async for block in client.stream_pcap(mpReq, timeRange, None):
+                out.write(block)
+
+        await asyncio.gather(*[fetch(c, ...) for c in clients])
+
+    Construction fetches the WSDL synchronously, as CorvilApiMtomClient does.
+    """
+    async def streamXmlMtomResponse(self, requestXml, zeroCopy=None):
+        """
+           Sent the specified request in a POST request, and return an
+           async generator that streams back the response in blocks
+
+           With zeroCopy (default: the client's zeroCopy setting) the blocks
+           are memoryviews into a buffer that is reused for the next block,
+           as with getXmlMtomResponseInBlocks. Otherwise each block is a
+           bytes copy.
+        """
+        if zeroCopy is None:
+            zeroCopy = self.zeroCopy
+        if isinstance(requestXml, str):
+            requestXml = requestXml.encode('utf-8')
+        if self.useHttps:
+            port = 443
+            sslContext = ssl._create_default_https_context()
+        else:
+            port = int(self.port)
+            sslContext = None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, port, ssl=sslContext), self.timeout)
+        try:
+            auth = base64.encodebytes(('%s:%s' % (self.username, self.password)).encode('utf-8')).decode('utf-8')[:-1]
+            request = ("POST %s HTTP/1.1\r\n"
+                       "Host: %s\r\n"
+                       "Accept: application/xop+xml\r\n"
+                       "Content-Type: text/xml; charset=utf-8\r\n"
+                       "Authorization: Basic %s\r\n"
+                       "Content-Length: %d\r\n"
+                       "Connection: close\r\n"
+                       "\r\n" % (self.url, self.host, auth, len(requestXml)))
+            writer.write(request.encode('utf-8') + requestXml)
+            await writer.drain()
+
+            statusLine = await asyncio.wait_for(reader.readline(), self.timeout)
+            if not statusLine.startswith(b'HTTP/'):
+                raise Exception("Bad HTTP status line `%s'" % statusLine.decode("utf-8", "replace").strip())
+            headers = {}
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.timeout)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            body = AsyncMtomResponseReader(AsyncHttpBody(reader, headers, self.timeout))
+            endMarker = await body.readHeadersAsync(self.MAX_XML_SIZE)
+            async for block in body.getDataBlocksAsync(endMarker, self.READ_BLOCK_SIZE):
+                if zeroCopy:
+                    yield block
+                else:
+                    yield bytes(block)
+        finally:
+            writer.close()
+            # wait_closed is Python 3.7+; without it the transport is closed on a later loop iteration
+            if hasattr(writer, 'wait_closed'):
+                try:
+                    await writer.wait_closed()
+                except OSError:
+                    pass
+
+    def stream_pcap(self, mpReq, timeRange, filters, extraMps = [], params = {}):
+        envelope = self.buildRequestEnvelope(params, "getPcap", mpReq, timeRange, filters, extraMps)
+        return self.streamXmlMtomResponse(envelope)
+
+    def stream_message_gap_csv(self, mpReq, timeRange, filters, params = {}):
+        envelope = self.buildRequestEnvelope(params, "getMessageGapCsv", mpReq, timeRange, filters)
+        return self.streamXmlMtomResponse(envelope)
+
+    def stream_multihop_csv(self, mpReq, messageId, params = {}):
+        envelope = self.buildRequestEnvelope(params, "getMessageMultiHopCsv", mpReq, messageId)
+        return self.streamXmlMtomResponse(envelope)
+
+    def stream_message_csv(self, mpReq, timeRange, filters, params = {}):
+        envelope = self.buildRequestEnvelope(params, "getMessageCsv", mpReq, timeRange, filters)
+        return self.streamXmlMtomResponse(envelope)
+
+    def stream_packet_csv(self, mpReq, timeRange, filters, params = {}):
+        envelope = self.buildRequestEnvelope(params, "getPacketCsv", mpReq, timeRange, filters)
+        return self.streamXmlMtomResponse(envelope)
+
+    def stream_lens_csv(self, rp, view, params = {}):
+        envelope = self.buildRequestEnvelope(params, "getLensCsv", rp, view)
+        return self.streamXmlMtomResponse(envelope)
+
+    def stream_flow_table_csv(self, timeRange, query, aggregation, summariesOnly, params = {}):
+        envelope = self.buildRequestEnvelope(params, "getFlowTableCsv", timeRange, query, aggregation, summariesOnly)
+        return self.streamXmlMtomResponse(envelope)
+
+class MessageFrameDecoder():
+    """
+    Splits a stream of length-prefixed messages (a 2 byte big-endian length
+    followed by that many bytes) into messages, calling
+    decodeMessage(message) for each one.
+
+    Messages are handed over as memoryview slices of the block they arrived
+    in, only valid for the duration of the call. The only bytes kept
+    between blocks are the start of a message that continues in the next
+    block; once complete, that message is passed as bytes. The cost per
+    message is one struct unpack and one slice, however many messages a
+    block holds.
+    """
+    LENGTH = struct.Struct('>H')
+
+    def __init__(self, decodeMessage):
+        self.decodeMessage = decodeMessage
+        self.partial = bytearray()
+        self.messages = 0
+
+    def feed(self, block):
+        view = memoryview(block)
+        pos = 0
+        if self.partial:
+            pos = self._completePartial(view)
+            if pos is None:
+                return
+        size = len(view)
+        unpack = self.LENGTH.unpack_from
+        decode = self.decodeMessage
+        count = 0
+        while pos + 2 <= size:
+            end = pos + 2 + unpack(view, pos)[0]
+            if end > size:
+                break
+            decode(view[pos + 2:end])
+            pos = end
+            count += 1
+        self.messages += count
+        if pos < size:
+            self.partial += view[pos:]
+
+    def _completePartial(self, view):
+        """Finish the carried over message, returning the offset after it in view"""
+        pos = 0
+        if len(self.partial) < 2:
+            pos = 2 - len(self.partial)
+            self.partial += view[:pos]
+            if len(self.partial) < 2:
+                return None
+        end = 2 + self.LENGTH.unpack_from(self.partial)[0]
+        take = end - len(self.partial)
+        self.partial += view[pos:pos + take]
+        if len(self.partial) < end:
+            return None
+        message = bytes(self.partial[2:])
+        self.partial = bytearray()
+        self.messages += 1
+        self.decodeMessage(message)
+        return pos + take
+
+    def pending(self):
+        """Number of bytes of an incomplete message held over"""
+        return len(self.partial)
+
+def findByte(view, byte, reverse=False, chunkSize=64 * 1024):
+    """
+    Index of the first (or with reverse the last) occurrence of a single
+    byte in a bytes-like view, or -1, copying it out chunkSize at a time
+    as memoryview has no find
+    """
+    size = len(view)
+    if reverse:
+        end = size
+        while end > 0:
+            start = max(0, end - chunkSize)
+            found = bytes(view[start:end]).rfind(byte)
+            if found >= 0:
+                return start + found
+            end = start
+    else:
+        start = 0
+        while start < size:
+            found = bytes(view[start:start + chunkSize]).find(byte)
+            if found >= 0:
+                return start + found
+            start += chunkSize
+    return -1
+
+def parseCsvTimestamp(value):
+    """
+    Parse a CSV timestamp field to epoch nanoseconds. Accepts epoch
+    seconds/milliseconds/microseconds/nanoseconds (told apart by magnitude),
+    fractional epoch seconds and "YYYY-MM-DD HH:MM:SS[.fraction]" local
+    time. Returns None if the field is not a timestamp.
+    """
+    value = value.strip()
+    if not value:
+        return None
+    whole, _, fraction = value.partition('.')
+    if whole.isdigit() and (not fraction or fraction.isdigit()):
+        if fraction:
+            return int(whole) * int(1e9) + int(fraction[:9].ljust(9, '0'))
+        ns = int(whole)
+        for limit, scale in ((1e17, 1), (1e14, 1000), (1e11, 1000000)):
+            if ns >= limit:
+                return ns * scale
+        return ns * int(1e9)
+    try:
+        t = time.strptime(whole.replace('T', ' '), "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+    if fraction and not fraction.isdigit():
+        return None
+    return int(time.mktime(t)) * int(1e9) + int(fraction[:9].ljust(9, '0') or 0)
+
+def csvTimestampColumn(names):
+    """Index of the timestamp column in a CSV header row, or None"""
+    for index, name in enumerate(names):
+        if 'timestamp' in name.lower() or name.strip().lower() == 'time':
+            return index
+    return None
+
+def csvColumnType(name):
+    """
+    array typecode for a CSV column from its header name: 'q' for
+    timestamps, 'd' for latencies and other durations, None for text
+    """
+    lower = name.strip().lower()
+    if 'timestamp' in lower or lower == 'time':
+        return 'q'
+    for word in ('latency', 'jitter', 'delay', 'duration'):
+        if word in lower:
+            return 'd'
+    return None
+
+class TimestampColumn(array.array):
+    """
+    array('q') of epoch nanoseconds from a CSV timestamp column, with a
+    validity mask: valid[i] is 0 where the field was empty or not a
+    timestamp, and the value there is 0
+    """
+    @classmethod
+    def fromFields(cls, values):
+        parsed = [parseCsvTimestamp(value) for value in values]
+        column = cls('q', [0 if ts is None else ts for ts in parsed])
+        column.valid = bytearray(ts is not None for ts in parsed)
+        return column
+
+    def validityBitmap(self):
+        """The mask as an Arrow validity bitmap, least significant bit first, or None if all valid"""
+        if 0 not in self.valid:
+            return None
+        bitmap = bytearray((len(self.valid) + 7) // 8)
+        for i, flag in enumerate(self.valid):
+            if flag:
+                bitmap[i >> 3] |= 1 << (i & 7)
+        return pyarrow.py_buffer(bitmap)
+
+def csvFloat(value):
+    try:
+        return float(value)
+    except ValueError:
+        return float('nan')
+
+def csvNumber(value):
+    """
+    int or float from a CSV field, keeping integer totals exact. Raises
+    ValueError for nan and inf, which would poison the running statistics
+    """
+    try:
+        return int(value)
+    except ValueError:
+        number = float(value)
+    if not math.isfinite(number):
+        raise ValueError("non-finite number %s" % value)
+    return number
+
+class GapStatistics():
+    """
+    Running statistics of the gaps in a message-gap CSV, fed the rows as
+    they stream: for each value of the key columns (e.g. session and
+    symbol), the number of gaps, their total and largest size, and a
+    histogram of the sizes in power of two buckets. Memory use grows with
+    the number of keys, not of rows.
+
+    Without explicit columns the keys are the columns whose names contain
+    one of KEY_WORDS, and the gap is the first non-timestamp column whose
+    name contains 'gap', preferring one that also names a size.
+    """
+    KEY_WORDS = ('session', 'symbol')
+    SIZE_WORDS = ('size', 'length', 'count', 'messages')
+
+    def __init__(self, keyColumns=None, gapColumn=None):
+        self.keyColumns = keyColumns
+        self.gapColumn = gapColumn
+        self.header = None
+        self.keys = None
+        self.gap = None
+        self.stats = {}
+        self.rows = 0
+        self.invalid = 0
+
+    def columnIndex(self, header, name):
+        lower = [h.strip().lower() for h in header]
+        if name.strip().lower() not in lower:
+            raise Exception("no column '%s' in the gap CSV header: %s" % (name, header))
+        return lower.index(name.strip().lower())
+
+    def setHeader(self, header):
+        self.header = header
+        lower = [h.strip().lower() for h in header]
+        if self.keyColumns is not None:
+            self.keys = [self.columnIndex(header, name) for name in self.keyColumns]
+        else:
+            self.keys = [i for i, name in enumerate(lower) if any(word in name for word in self.KEY_WORDS)]
+        if self.gapColumn is not None:
+            self.gap = self.columnIndex(header, self.gapColumn)
+        else:
+            candidates = [i for i, name in enumerate(lower) if 'gap' in name and csvColumnType(name) != 'q']
+            sized = [i for i in candidates if any(word in lower[i] for word in self.SIZE_WORDS)]
+            if not candidates:
+                raise Exception("cannot tell the gap column of %s, name it with --gap-column" % (header,))
+            self.gap = (sized or candidates)[0]
+        self.width = max(self.keys + [self.gap]) + 1
+
+    def addRows(self, rows):
+        for row in rows:
+            if self.header is None:
+                self.setHeader(row)
+                continue
+            self.rows += 1
+            if len(row) < self.width:
+                self.invalid += 1
+                continue
+            try:
+                value = csvNumber(row[self.gap])
+            except ValueError:
+                self.invalid += 1
+                continue
+            key = tuple(row[i] for i in self.keys)
+            stats = self.stats.get(key)
+            if stats is None:
+                # count, total, max, {bucket: count}
+                stats = self.stats[key] = [0, 0, value, {}]
+            stats[0] += 1
+            stats[1] += value
+            if value > stats[2]:
+                stats[2] = value
+            # bucket e holds [2^(e-1), 2^e), None the sizes <= 0
+            bucket = math.frexp(value)[1] if value > 0 else None
+            stats[3][bucket] = stats[3].get(bucket, 0) + 1
+
+    @staticmethod
+    def bucketName(bucket):
+        if bucket is None:
+            return "<=0"
+        # lo-hi for the sizes from lo up to but excluding hi
+        return "%g-%g" % (math.ldexp(1, bucket - 1), math.ldexp(1, bucket))
+
+    def writeSummary(self, output):
+        """Write one CSV row per key, sorted by key, with a column per histogram bucket"""
+        if self.header is None:
+            return
+        buckets = set()
+        for stats in self.stats.values():
+            buckets.update(stats[3])
+        buckets = sorted(buckets, key=lambda b: -math.inf if b is None else b)
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow([self.header[i] for i in self.keys] + ['gaps', 'total_gap', 'mean_gap', 'max_gap'] +
+                        [self.bucketName(b) for b in buckets])
+        for key in sorted(self.stats):
+            count, total, largest, histogram = self.stats[key]
+            writer.writerow(list(key) + [count, total, '%.6g' % (total / count), largest] +
+                            [histogram.get(b, 0) for b in buckets])
+
+DURATION_UNITS_NS = {'ns': 1, 'us': 1000, 'ms': 1000000, 's': 1000000000,
+                     'm': 60 * 1000000000, 'h': 3600 * 1000000000}
+
+def parseDuration(value):
+    """Nanoseconds from a duration such as 100ms, 5s or 1h, in any case; a bare number is seconds"""
+    value = value.strip().lower()
+    number = value.rstrip('abcdefghijklmnopqrstuvwxyz')
+    unit = value[len(number):] or 's'
+    if unit not in DURATION_UNITS_NS:
+        raise ValueError("unknown duration unit in %s" % value)
+    return int(float(number) * DURATION_UNITS_NS[unit])
+
+def csvSummable(value):
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+def formatSum(value):
+    return str(int(value)) if value.is_integer() else repr(value)
+
+class FlowAggregator():
+    """
+    Streaming group-by of flow-index CSV rows, fed the column batches of
+    getCsvColumnsInBatches: the rows are counted and the sum columns
+    summed per time bucket of the timestamp column and value of the
+    group-by columns. The accumulators are a dict of key to position in
+    one array per aggregate, and the partial aggregates of time slices
+    fetched in parallel are combined with merge().
+
+    Without sumColumns the columns other than the timestamp and group-by
+    ones whose values in the first batch are all numbers are summed, see
+    numericColumns. Without bucketNs there is a single time bucket. Rows
+    whose timestamp does not parse are skipped and counted, and values that
+    are not numbers are left out of the sums.
+    """
+    def __init__(self, bucketNs=None, groupBy=(), sumColumns=None):
+        self.bucketNs = bucketNs
+        self.groupBy = list(groupBy)
+        self.sumColumns = list(sumColumns) if sumColumns is not None else None
+        self.timeColumn = None
+        self.names = None
+        self.index = {}
+        self.counts = array.array('q')
+        self.sums = collections.OrderedDict()
+        self.skipped = 0
+
+    def setColumns(self, columns):
+        self.names = names = list(columns.keys())
+        if self.bucketNs is not None:
+            column = csvTimestampColumn(names)
+            if column is None:
+                raise Exception("no timestamp column to bucket by in %s" % names)
+            self.timeColumn = names[column]
+        for name in self.groupBy + (self.sumColumns or []):
+            if name not in columns:
+                raise Exception("no column '%s' in the flow-index CSV header: %s" % (name, names))
+        if self.sumColumns is None:
+            self.sumColumns = self.numericColumns(columns, self.groupBy)
+        for name in self.sumColumns:
+            self.sums[name] = array.array('d', bytes(8 * len(self.counts)))
+
+    @staticmethod
+    def numericColumns(columns, groupBy=()):
+        """
+        The columns of a batch, other than the timestamp and groupBy ones,
+        whose values are all numbers
+        """
+        numeric = []
+        for name, values in columns.items():
+            if name in groupBy:
+                continue
+            if isinstance(values, array.array):
+                # timestamps are 'q'
+                if values.typecode == 'd':
+                    numeric.append(name)
+                continue
+            present = [value for value in values if value != '']
+            try:
+                [float(value) for value in present]
+            except ValueError:
+                continue
+            if present:
+                numeric.append(name)
+        return numeric
+
+    def add(self, columns):
+        if self.names is None:
+            self.setColumns(columns)
+        size = len(next(iter(columns.values()), ()))
+        times = columns[self.timeColumn] if self.timeColumn is not None else None
+        groups = [columns[name] for name in self.groupBy]
+        sums = [(self.sums[name], columns[name]) for name in self.sumColumns]
+        bucketNs = self.bucketNs
+        index = self.index
+        counts = self.counts
+        for i in range(size):
+            if times is not None and not times.valid[i]:
+                self.skipped += 1
+                continue
+            bucket = times[i] // bucketNs * bucketNs if times is not None else 0
+            key = (bucket,) + tuple(values[i] for values in groups)
+            pos = index.get(key)
+            if pos is None:
+                pos = index[key] = len(counts)
+                counts.append(0)
+                for total, _ in sums:
+                    total.append(0.0)
+            counts[pos] += 1
+            for total, values in sums:
+                value = values[i]
+                if not isinstance(value, float):
+                    value = csvSummable(value)
+                if value == value:
+                    # nan is a missing value
+                    total[pos] += value
+
+    def merge(self, other):
+        """Add the aggregates of other, e.g. those of another time slice, to these"""
+        if other.timeColumn is not None:
+            self.timeColumn = other.timeColumn
+        self.skipped += other.skipped
+        for name in other.sums:
+            if name not in self.sums:
+                self.sums[name] = array.array('d', bytes(8 * len(self.counts)))
+        for key, otherPos in other.index.items():
+            pos = self.index.get(key)
+            if pos is None:
+                pos = self.index[key] = len(self.counts)
+                self.counts.append(0)
+                for total in self.sums.values():
+                    total.append(0.0)
+            self.counts[pos] += other.counts[otherPos]
+            for name, total in other.sums.items():
+                self.sums[name][pos] += total[otherPos]
+
+    def write(self, output):
+        """Write the aggregates as CSV, in key order"""
+        writer = csv.writer(output, lineterminator='\n')
+        header = self.groupBy + ['rows'] + list(self.sums)
+        if self.bucketNs is not None:
+            header = ['bucket_start_ns'] + header
+        writer.writerow(header)
+        for key in sorted(self.index):
+            pos = self.index[key]
+            row = list(key[1:]) + [self.counts[pos]] + [formatSum(total[pos]) for total in self.sums.values()]
+            if self.bucketNs is not None:
+                row = [key[0]] + row
+            writer.writerow(row)
+
+class ParquetSink():
+    """
+    Writes the column batches of getCsvColumnsInBatches to a Parquet file,
+    one row group per batch. The typed columns are handed to pyarrow as
+    buffers, without converting them value by value.
+    """
+    def __init__(self, path):
+        if pyarrow is None:
+            raise Exception("-F parquet needs the pyarrow package")
+        self.path = path
+        self.writer = None
+
+    def write(self, columns):
+        arrays = []
+        for values in columns.values():
+            if isinstance(values, TimestampColumn):
+                arrays.append(pyarrow.Array.from_buffers(pyarrow.int64(), len(values),
+                                                         [values.validityBitmap(), pyarrow.py_buffer(values)],
+                                                         null_count=values.valid.count(0)))
+            elif isinstance(values, array.array):
+                arrowType = pyarrow.int64() if values.typecode == 'q' else pyarrow.float64()
+                arrays.append(pyarrow.Array.from_buffers(arrowType, len(values),
+                                                         [None, pyarrow.py_buffer(values)]))
+            else:
+                arrays.append(pyarrow.array(values, type=pyarrow.string()))
+        table = pyarrow.Table.from_arrays(arrays, names=list(columns.keys()))
+        if self.writer is None:
+            self.writer = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+class Lz4Compressor():
+    """lz4.frame's compressor behind the compress()/flush() interface of zlib's"""
+    def __init__(self, level):
+        self.compressor = lz4.frame.LZ4FrameCompressor(compression_level=level)
+        self.started = False
+
+    def compress(self, data):
+        if self.started:
+            return self.compressor.compress(data)
+        self.started = True
+        return self.compressor.begin() + self.compressor.compress(data)
+
+    def flush(self):
+        if self.started:
+            return self.compressor.flush()
+        self.started = True
+        return self.compressor.begin() + self.compressor.flush()
+
+def createCompressor(compression, level=None):
+    """A compress()/flush() compressor for gzip, zstd or lz4 at the given or default level"""
+    if level is None:
+        level = ThreadedSink.COMPRESSION_LEVELS[compression]
+    if compression == 'gzip':
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise Exception("zstd compression needs the zstandard package")
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    if compression == 'lz4':
+        if lz4 is None:
+            raise Exception("lz4 compression needs the lz4 package")
+        return Lz4Compressor(level)
+    raise Exception("Unknown compression: %s" % compression)
+
+class ThreadedSink():
+    """
+    Writes blocks to a binary file on its own thread, compressing them
+    first if a compression is given, or to a text file decoding them from
+    UTF-8 with text, so that reading the next blocks off the network
+    overlaps with the compression and a slow disk. Up to QUEUE_BLOCKS
+    blocks are queued before write() waits; flush() waits for the queued
+    blocks to be written and the file flushed. A failure on the writer
+    thread is raised by the following write(), flush() or close().
+    """
+    QUEUE_BLOCKS = 16
+    COMPRESSION_LEVELS = {'gzip': 6, 'zstd': 3, 'lz4': 0}
+    FLUSH = object()
+
+    def __init__(self, out, compression=None, level=None, queueBlocks=QUEUE_BLOCKS, text=False):
+        self.out = out
+        self.compressor = createCompressor(compression, level) if compression else None
+        self.decoder = codecs.getincrementaldecoder("utf-8")() if text else None
+        self.queue = queue.Queue(queueBlocks)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name='ThreadedSink', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        block = None
+        try:
+            while True:
+                block = self.queue.get()
+                try:
+                    if block is None:
+                        break
+                    if block is self.FLUSH:
+                        self.out.flush()
+                        continue
+                    if self.compressor is not None:
+                        block = self.compressor.compress(block)
+                    elif self.decoder is not None:
+                        block = self.decoder.decode(block)
+                    self.out.write(block)
+                finally:
+                    self.queue.task_done()
+            if self.compressor is not None:
+                self.out.write(self.compressor.flush())
+            elif self.decoder is not None:
+                self.out.write(self.decoder.decode(b'', final=True))
+            self.out.flush()
+        except BaseException as e:
+            self.error = e
+            # keep taking blocks so that write(), flush() and close() never wait on a dead thread
+            while block is not None:
+                block = self.queue.get()
+                self.queue.task_done()
+
+    def write(self, block):
+        if self.error is not None:
+            raise self.error
+        # the blocks may be views of a buffer the stream reuses
+        self.queue.put(bytes(block))
+
+    def flush(self):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(self.FLUSH)
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+class MappedFileWriter():
+    """
+    Writes a file through a memory map window that slides forward over
+    it, so each write is a memory copy into the page cache. The file is
+    preallocated EXTENT_SIZE at a time ahead of the window, so it is laid
+    out contiguously, and truncated to the size written on close. Opening
+    at an offset keeps the file up to there, for resuming.
+    """
+    EXTENT_SIZE = 256 * 1024 * 1024
+    WINDOW_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, path, offset=0):
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o666)
+        os.ftruncate(self.fd, offset)
+        self.pos = offset
+        self.allocated = offset
+        self.map = None
+        self.mapStart = 0
+
+    def preallocate(self, end):
+        if end <= self.allocated:
+            return
+        size = max(self.EXTENT_SIZE, end - self.allocated)
+        try:
+            os.posix_fallocate(self.fd, self.allocated, size)
+        except (AttributeError, OSError) as e:
+            # not every platform and file system can allocate, a sparse file will have to do
+            if isinstance(e, OSError) and e.errno not in (errno.EOPNOTSUPP, errno.EINVAL):
+                raise
+            os.ftruncate(self.fd, self.allocated + size)
+        self.allocated += size
+
+    def remap(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.mapStart = self.pos - self.pos % mmap.ALLOCATIONGRANULARITY
+        self.preallocate(self.mapStart + self.WINDOW_SIZE)
+        self.map = mmap.mmap(self.fd, self.WINDOW_SIZE, offset=self.mapStart)
+
+    def write(self, data):
+        view = memoryview(data)
+        size = len(view)
+        done = 0
+        while done < size:
+            if self.map is None or self.pos >= self.mapStart + self.WINDOW_SIZE:
+                self.remap()
+            start = self.pos - self.mapStart
+            n = min(size - done, self.WINDOW_SIZE - start)
+            self.map[start:start + n] = view[done:done + n]
+            done += n
+            self.pos += n
+        return size
+
+    def tell(self):
+        return self.pos
+
+    def flush(self):
+        """
+        Write the mapped window and the earlier ones back to disk, so that a
+        checkpoint saved after this does not claim data a crash would lose
+        """
+        if self.map is not None:
+            self.map.flush()
+        os.fsync(self.fd)
+
+    def close(self):
+        if self.fd is None:
+            return
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        os.ftruncate(self.fd, self.pos)
+        os.close(self.fd)
+        self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class DownloadCheckpoint():
+    """
+    Sidecar checkpoint for a download written to a file. It records the
+    request, the timestamp of the last complete record and the file offset
+    at which the records with that timestamp start, so an interrupted
+    download can be truncated there and re-requested from that timestamp.
+    """
+    SUFFIX = '.ckpt'
+    SAVE_INTERVAL_SECONDS = 5
+
+    def __init__(self, outputFile, request):
+        self.path = outputFile + self.SUFFIX
+        self.request = request
+        self.lastSave = 0
+
+    def load(self):
+        """Return the saved state for this request, or None"""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if state.get("request") != self.request:
+            raise Exception("checkpoint %s is for a different request: %s" % (self.path, state.get("request")))
+        return state
+
+    def save(self, timestampNs, offset, complete=False):
+        state = {"request": self.request, "timestampNs": timestampNs,
+                 "offset": offset, "complete": complete}
+        tmpPath = self.path + '.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmpPath, self.path)
+        self.lastSave = time.time()
+
+    def due(self):
+        return time.time() - self.lastSave >= self.SAVE_INTERVAL_SECONDS
+
+class PcapCheckpointTracker(PcapStreamScanner):
+    """
+    Tracks the checkpoint position of a pcap download: the first record of
+    the latest timestamp seen. A resumed stream starts with its own global
+    header, which is not written again.
+    """
+    def __init__(self, fileBase=0, state=None):
+        PcapStreamScanner.__init__(self)
+        self.fileBase = fileBase
+        self.skip = GLOBAL_HEADER_LEN if state else 0
+        self.checkpoint = (state["timestampNs"], state["offset"]) if state else None
+
+    def feed(self, block):
+        """Scan a block, returning the part of it to be written"""
+        skip = max(0, self.skip - self.offset)
+        PcapStreamScanner.feed(self, block)
+        return memoryview(block)[skip:]
+
+    def record(self, offset, timestampNs, length):
+        if self.checkpoint is None or timestampNs > self.checkpoint[0]:
+            self.checkpoint = (timestampNs, self.fileBase + offset - self.skip)
+
+class CsvCheckpointTracker():
+    """
+    Tracks the checkpoint position of a CSV download. The timestamp column
+    is found from the header row; after each block the last complete rows
+    are parsed to find where the rows with the latest timestamp start. A
+    resumed stream starts with its own header row, which is not written
+    again.
+    """
+    MAX_HEADER_SIZE = 64 * 1024
+    TAIL_SIZE = 64 * 1024
+
+    def __init__(self, fileBase=0, state=None):
+        self.fileBase = fileBase
+        self.resumed = state is not None
+        self.checkpoint = (state["timestampNs"], state["offset"]) if state else None
+        self.header = b''
+        self.column = None
+        self.offset = 0
+        self.skip = 0
+        self.atRowStart = False
+
+    def feed(self, block):
+        """Scan a block, returning the part of it to be written"""
+        view = memoryview(block)
+        start = self.offset
+        self.offset += len(view)
+        begin = 0
+        if self.column is None:
+            head = bytes(view[:self.MAX_HEADER_SIZE])
+            end = head.find(b'\n')
+            if end < 0:
+                self.header += head
+                if len(self.header) >= self.MAX_HEADER_SIZE:
+                    raise Exception("CSV header row too long")
+                if self.resumed:
+                    self.skip = self.offset
+                    return view[:0]
+                return view
+            self.header += head[:end]
+            self.column = self.timestampColumn(self.header)
+            begin = end + 1
+            if self.resumed:
+                self.skip = start + begin
+        self.updateCheckpoint(view, start, begin)
+        if self.resumed and begin:
+            return view[begin:]
+        return view
+
+    def timestampColumn(self, header):
+        names = next(csv.reader([header.decode("utf-8", "replace").strip()]), [])
+        column = csvTimestampColumn(names)
+        if column is None:
+            raise Exception("no timestamp column in CSV header, cannot checkpoint")
+        return column
+
+    def rowTimestamp(self, line):
+        row = next(csv.reader([line.decode("utf-8", "replace")]), [])
+        if len(row) <= self.column:
+            return None
+        return parseCsvTimestamp(row[self.column])
+
+    def updateCheckpoint(self, view, start, begin):
+        # only the tail of the block is looked at: find the last complete
+        # row, then walk back over the rows that share its timestamp
+        tailStart = max(begin, len(view) - self.TAIL_SIZE)
+        tail = bytes(view[tailStart:])
+        rowStartKnown = tailStart == begin and (begin > 0 or self.atRowStart)
+        if len(view) > begin:
+            self.atRowStart = tail.endswith(b'\n')
+        lineEnd = tail.rfind(b'\n')
+        groupTs = None
+        groupStart = None
+        while lineEnd >= 0:
+            lineStart = tail.rfind(b'\n', 0, lineEnd) + 1
+            if lineStart == 0 and not rowStartKnown:
+                break
+            ts = self.rowTimestamp(tail[lineStart:lineEnd].rstrip(b'\r'))
+            if ts is None:
+                break
+            if groupTs is None:
+                groupTs = ts
+            elif ts != groupTs:
+                # every row from groupStart on has the latest timestamp
+                self.checkpoint = (groupTs, self.fileBase + start + tailStart + groupStart - self.skip)
+                return
+            groupStart = lineStart
+            if lineStart == 0:
+                break
+            lineEnd = lineStart - 1
+        # the start of the latest timestamp's rows is not in this block; an
+        # older checkpoint is still safe to resume from
+
 class MtomTool(CorvilApiMtomClient):
     def __init__(self, host="localhost", port=5101, username='admin', password='LOCAL:', cne=None, useHttps=False, commandLine=False):
-        self.msgBlock = ""
-        self.msgSize = 0
+        self.frameDecoder = MessageFrameDecoder(self.decodeMessage)
         if commandLine == False:
             self.client = CorvilApiMtomClient(host, port=port,
                 password = password, username=username,cne=cne, useHttps=useHttps)
@@ -491,21 +2267,47 @@ class MtomTool(CorvilApiMtomClient):
         print(len(msg))
 
     def processBlock(self, block):
-        self.msgBlock += block
-        while True:
-            if self.msgSize == 0:
-                # waiting for size
-                if len(self.msgBlock) > 2:
-                    self.msgSize = ord(self.msgBlock[0])*256 + ord(self.msgBlock[1])
-                    self.msgBlock = self.msgBlock[2:]
-            if self.msgSize > 0:
-                if len(self.msgBlock) >= self.msgSize:
-                    msgToDecode = self.msgBlock[0:self.msgSize-1]
-                    self.decodeMessage(msgToDecode)
-                    self.msgBlock = self.msgBlock[self.msgSize:]
-                    self.msgSize = 0
-                else:
-                    break
+        """Split a block of a length-prefixed message stream, see MessageFrameDecoder"""
+        self.frameDecoder.feed(block)
+
+    def write_parquet(self, dataGen, outputFile):
+        """Write a CSV stream to a Parquet file as typed columns"""
+        sink = ParquetSink(outputFile)
+        try:
+            for columns in self.client.getCsvColumnsInBatches(dataGen):
+                sink.write(columns)
+        finally:
+            sink.close()
+
+    def report_stats(self):
+        """Print the StreamMetrics of the streams run to stderr"""
+        metrics = self.client.streamMetrics
+        streams, total, elapsed = metrics.totals()
+        first = streams - len(metrics)
+        if first:
+            sys.stderr.write("(%d earlier streams not shown)\n" % first)
+        for i, stream in enumerate(metrics, first + 1):
+            sys.stderr.write("stream %d: %s\n" % (i, stream))
+        if streams > 1:
+            sys.stderr.write("total: %d streams, %d bytes in %.3fs at %.2f MB/s\n" %
+                             (streams, total, elapsed, total / elapsed / 1e6 if elapsed else 0.0))
+
+    def report_prefetch(self):
+        """Print the summed BlockPrefetcher stats of the streams run to stderr"""
+        sys.stderr.write("prefetch: %s\n" % self.client.prefetchStats)
+
+    def write_blocks(self, dataGen, out, compression=None, level=None, text=False):
+        """Write a stream to a binary (or with text a text) file through a ThreadedSink"""
+        sink = ThreadedSink(out, compression, level, text=text)
+        try:
+            for block in dataGen:
+                sink.write(block)
+        finally:
+            sink.close()
+
+    def write_text(self, dataGen):
+        """Write a UTF-8 stream to stdout, even if characters straddle blocks"""
+        self.write_blocks(dataGen, sys.stdout, text=True)
 
     def parseHost(self, host):
         parts = host.split(':', 2)
@@ -589,6 +2391,62 @@ class MtomTool(CorvilApiMtomClient):
         dataGen = self.client.getMultihopCsvInBlocks(mpReq, messageId, params=params)
 
         return dataGen
+
+    def get_multihop_csv_batch(self, messageIds, mpReq, baseParams, workers, output):
+        """
+        Look up the multihop path of each (timestamp, message_id,
+        message_index) row of messageIds, streaming up to `workers` at once
+        over the one client, and write them to output as one CSV with the
+        message ID in the leading columns, in input order. Lookups that fail
+        are reported on stderr and skipped; returns the number of failures.
+        """
+        def fetch(dataGen):
+            text = ''.join(self.client.getCsvTextInBlocks(dataGen))
+            return list(csv.reader(io.StringIO(text, newline='')))
+
+        writer = csv.writer(output, lineterminator='\n')
+        pending = collections.deque()
+        state = {'header': None, 'failures': 0}
+
+        def writeResults(maxPending):
+            while len(pending) > maxPending:
+                messageId, future = pending.popleft()
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    sys.stderr.write("multihop-csv %s failed: %s\n" % (",".join(messageId), e))
+                    state['failures'] += 1
+                    continue
+                if not rows:
+                    continue
+                if state['header'] is None:
+                    state['header'] = rows[0]
+                    writer.writerow(['packet_timestamp', 'packet_id', 'message_index'] + rows[0])
+                elif rows[0] != state['header']:
+                    sys.stderr.write("multihop-csv %s failed: CSV header differs: %s\n" %
+                                     (",".join(messageId), rows[0]))
+                    state['failures'] += 1
+                    continue
+                for row in rows[1:]:
+                    writer.writerow(messageId + row)
+
+        # the requests are built here, a bounded window of them is streamed on the workers
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            for lineNo, row in enumerate(messageIds, 1):
+                row = [field.strip() for field in row]
+                if not row or not row[0] or row[0].startswith('#'):
+                    continue
+                if len(row) != 3:
+                    sys.stderr.write("Line %d: expected <packet_timestamp>,<packet_id>,<message_index>\n" % lineNo)
+                    state['failures'] += 1
+                    continue
+                timestamp, message_id, message_index = row
+                dataGen = self.get_multihop_csv(timestamp, message_id, message_index, mpReq, baseParams)
+                pending.append((row, pool.submit(fetch, dataGen)))
+                writeResults(2 * workers)
+            writeResults(0)
+        output.flush()
+        return state['failures']
     
     
     def add_filters(self, cliFilterObject):
@@ -688,6 +2546,332 @@ class MtomTool(CorvilApiMtomClient):
             msvcrt.setmode(sys.stdout.fileno(), os.O_BINARY) # pylint: disable=no-member
         return dataGen
 
+    def get_pcap_parallel(self, parallel, bidir, baseParams, mpReq, startTime, endTime, cliFilterObject,
+                          extraMps = None, snaplength = None):
+        """
+        Fetch the time range as `parallel` contiguous slices on concurrent
+        connections, spooling each slice to a temporary file, and return a
+        generator of one merged pcap. Slices that are in time order are
+        concatenated, dropping the repeated global headers and any record
+        repeated on both sides of a slice boundary; otherwise the records
+        of all slices are k-way merged on their timestamps.
+        """
+        fromNs = self.parseTime(startTime)
+        toNs = self.parseTime(endTime)
+        if toNs - fromNs < parallel:
+            parallel = 1
+        bounds = [fromNs + (toNs - fromNs) * i // parallel for i in range(parallel)] + [toNs]
+
+        # the requests are built here, the slices are only streamed on the workers
+        dataGens = [self.get_pcap(bidir, baseParams, mpReq, bounds[i], bounds[i + 1], cliFilterObject,
+                                  extraMps, snaplength)
+                    for i in range(parallel)]
+        spools = [tempfile.TemporaryFile() for _ in dataGens]
+        scanners = self.spool_streams(dataGens, spools, parallel, PcapStreamScanner)
+        for scanner in scanners:
+            if scanner.offset and not scanner.isComplete():
+                raise PcapFormatError("pcap slice ends part way through a record")
+
+        return self.mergePcapSlices(list(zip(scanners, spools)))
+
+    def spool_streams(self, dataGens, spools, workers, scannerClass=None):
+        """
+        Write each of dataGens to the matching file of spools, running up to
+        `workers` streams at once on a thread pool. If scannerClass is given
+        every stream is also fed through one of them, and the scanners are
+        returned in dataGens order.
+        """
+        def spool(dataGen, f):
+            scanner = scannerClass() if scannerClass else None
+            sink = ThreadedSink(f)
+            try:
+                for block in dataGen:
+                    if scanner:
+                        scanner.feed(block)
+                    sink.write(block)
+            finally:
+                sink.close()
+            return scanner
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(spool, dataGen, f) for dataGen, f in zip(dataGens, spools)]
+            return [f.result() for f in futures]
+
+    def mergePcapSlices(self, slices):
+        """Generator of one pcap from spooled (scanner, file) slices in time order"""
+        spools = [spool for _, spool in slices]
+        slices = [(scanner, spool) for scanner, spool in slices if scanner.header is not None]
+        try:
+            if not slices:
+                return
+            header = slices[0][0].header
+            for scanner, _ in slices:
+                if scanner.header.raw != header.raw:
+                    raise PcapFormatError("pcap slices have different global headers")
+            yield header.raw
+
+            inOrder = all(scanner.ordered for scanner, _ in slices)
+            for (prev, _), (cur, _) in zip(slices, slices[1:]):
+                if cur.firstTs is not None and prev.lastTs is not None and cur.firstTs < prev.lastTs:
+                    inOrder = False
+
+            if inOrder:
+                prevTail = None
+                for scanner, spool in slices:
+                    spool.seek(GLOBAL_HEADER_LEN)
+                    if prevTail:
+                        # skip records that the previous slice also returned at its end
+                        records = readRecords(spool, header)
+                        for ts, record in records:
+                            if ts != prevTail[0] or record not in prevTail[1]:
+                                yield record
+                                break
+                    while True:
+                        block = spool.read(self.client.READ_BLOCK_SIZE)
+                        if not block:
+                            break
+                        yield block
+                    if scanner.lastTs is not None:
+                        tail = set()
+                        for offset in scanner.lastTsOffsets:
+                            spool.seek(offset)
+                            tail.add(next(readRecords(spool, header))[1])
+                        prevTail = (scanner.lastTs, tail)
+            else:
+                def tagged(index, spool):
+                    spool.seek(GLOBAL_HEADER_LEN)
+                    for ts, record in readRecords(spool, header):
+                        yield (ts, index, record)
+                last = None
+                for ts, index, record in heapq.merge(*[tagged(i, spool) for i, (_, spool) in enumerate(slices)],
+                                                     key=lambda r: r[0]):
+                    # a record returned by two neighbouring slices is only written once
+                    if last is not None and last[0] == ts and last[1] != index and last[2] == record:
+                        continue
+                    last = (ts, index, record)
+                    yield record
+        finally:
+            for spool in spools:
+                spool.close()
+
+    def flow_rollup(self, getDataGen, startTime, endTime, parallel, output, bucketNs=None, groupBy=(),
+                    sumColumns=None):
+        """
+        Aggregate the flow-index CSV returned by getDataGen(fromNs, toNs)
+        with a FlowAggregator, fetching the time range as `parallel`
+        contiguous slices at once and merging their partial aggregates,
+        and write the result to output as CSV
+        """
+        fromNs = self.parseTime(startTime)
+        toNs = self.parseTime(endTime)
+        if toNs - fromNs < parallel:
+            parallel = 1
+        bounds = [fromNs + (toNs - fromNs) * i // parallel for i in range(parallel)] + [toNs]
+
+        # without sumColumns they are picked once, from the first batch of
+        # whichever slice gets there first, so that every slice sums the same
+        detected = []
+        detectLock = threading.Lock()
+
+        def aggregate(dataGen):
+            aggregator = FlowAggregator(bucketNs, groupBy, sumColumns)
+            for columns in self.client.getCsvColumnsInBatches(dataGen):
+                if aggregator.sumColumns is None:
+                    with detectLock:
+                        if not detected:
+                            detected.append(FlowAggregator.numericColumns(columns, groupBy))
+                    aggregator.sumColumns = list(detected[0])
+                aggregator.add(columns)
+            return aggregator
+
+        # the requests are built here, the slices are only streamed on the workers
+        dataGens = [getDataGen(bounds[i], bounds[i + 1]) for i in range(parallel)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=parallel) as pool:
+            aggregators = list(pool.map(aggregate, dataGens))
+        total = aggregators[0]
+        for aggregator in aggregators[1:]:
+            total.merge(aggregator)
+        total.write(output)
+        if total.skipped:
+            sys.stderr.write("%d rows skipped without a valid timestamp\n" % total.skipped)
+
+    def gap_stats(self, dataGen, output, keyColumns=None, gapColumn=None):
+        """Write the GapStatistics summary of a gap CSV stream to output"""
+        stats = GapStatistics(keyColumns, gapColumn)
+        for rows in self.client.getCsvRowsInBatches(dataGen):
+            stats.addRows(rows)
+        stats.writeSummary(output)
+        sys.stderr.write("%d gaps in %d keys, %d rows skipped\n" %
+                         (stats.rows - stats.invalid, len(stats.stats), stats.invalid))
+
+    def split_pcap(self, dataGen, outputDir, mode, maxOpenFiles=PcapSplitter.MAX_OPEN_FILES):
+        """Split a pcap stream into per-flow or per-VLAN files in outputDir, see PcapSplitter"""
+        os.makedirs(outputDir, exist_ok=True)
+        splitter = PcapSplitter(outputDir, mode, maxOpenFiles)
+        try:
+            # the records are routed and written on the sink's thread
+            self.write_blocks(dataGen, splitter)
+        finally:
+            splitter.close()
+        if splitter.header is not None and not splitter.isComplete():
+            raise PcapFormatError("pcap stream ends part way through a record")
+        sys.stderr.write("split %d records into %d files in %s\n" %
+                         (splitter.records, len(splitter.created), outputDir))
+
+    def open_output(self, outputFile, offset=0, preallocate=False):
+        """
+        Open outputFile for writing from offset, keeping what is before it,
+        through a MappedFileWriter with preallocate
+        """
+        if preallocate:
+            return MappedFileWriter(outputFile, offset)
+        if not offset:
+            return open(outputFile, 'wb')
+        f = open(outputFile, 'r+b')
+        f.truncate(offset)
+        f.seek(offset)
+        return f
+
+    def download_request(self, cmd, mpReq, startTime, endTime, baseParams, cliFilterObject, **options):
+        """
+        The request recorded in a DownloadCheckpoint: every parameter that
+        shapes the stream, so that --resume refuses a different request
+        """
+        request = {"command": cmd, "mp": mpReq, "fromNs": self.parseTime(startTime),
+                   "toNs": self.parseTime(endTime), "params": dict(baseParams),
+                   "filter": dict(cliFilterObject) if cliFilterObject else None}
+        request.update(options)
+        return request
+
+    def download_to_file(self, outputFile, resume, request, trackerClass, getDataGen, indexer=None,
+                         preallocate=False):
+        """
+        Write the stream returned by getDataGen(startTime) to outputFile,
+        keeping a sidecar DownloadCheckpoint up to date as it goes. With
+        resume, a matching checkpoint is used to truncate the file to the
+        last good record and getDataGen is called with that record's
+        timestamp instead of None. An indexer, such as a PcapIndexBuilder,
+        is fed the file as written and its index written alongside once
+        the download is complete. preallocate is passed on to open_output.
+        """
+        checkpoint = DownloadCheckpoint(outputFile, request)
+        state = checkpoint.load() if resume else None
+        if state and state["complete"]:
+            sys.stderr.write("%s is already complete\n" % outputFile)
+            return
+        if state:
+            if indexer is not None:
+                with open(outputFile, 'rb') as existing:
+                    indexer.feedFile(existing, state["offset"])
+            f = self.open_output(outputFile, state["offset"], preallocate)
+            tracker = trackerClass(state["offset"], state)
+            dataGen = getDataGen(state["timestampNs"])
+        else:
+            f = self.open_output(outputFile, 0, preallocate)
+            tracker = trackerClass()
+            dataGen = getDataGen(None)
+        with f:
+            sink = ThreadedSink(f)
+            try:
+                for block in dataGen:
+                    block = tracker.feed(block)
+                    sink.write(block)
+                    if indexer is not None:
+                        indexer.feed(block)
+                    if tracker.checkpoint and checkpoint.due():
+                        sink.flush()
+                        checkpoint.save(*tracker.checkpoint)
+            except BaseException:
+                # only checkpoint what the sink did write
+                sink.close()
+                if tracker.checkpoint:
+                    checkpoint.save(*tracker.checkpoint)
+                raise
+            sink.close()
+            if indexer is not None:
+                indexer.write(outputFile + INDEX_SUFFIX)
+            checkpoint.save(tracker.checkpoint[0] if tracker.checkpoint else None, f.tell(), complete=True)
+
+    def cnes_with_mp(self, mpName):
+        """
+        Return the CMC's CNEs that have the measurement point mpName,
+        reporting the others on stderr
+        """
+        cnes = []
+        for cne in self.client.getCnes():
+            try:
+                names = self.client.getMeasurementPointNames(params={'cne': cne})
+            except suds.WebFault as e:
+                sys.stderr.write("Skipping CNE %s, cannot list its measurement points: %s\n" % (cne, e))
+                continue
+            if mpName not in names:
+                sys.stderr.write("Skipping CNE %s, it has no measurement point %s\n" % (cne, mpName))
+                continue
+            cnes.append(cne)
+        if not cnes:
+            sys.stderr.write("No CNE has the measurement point %s\n" % mpName)
+            sys.exit(1)
+        return cnes
+
+    def fan_out(self, cnes, workers, getDataGen, outputDir=None):
+        """
+        Run the CSV stream returned by getDataGen(baseParams) for each of the
+        CMC's CNEs, up to `workers` at once. With outputDir each CNE's CSV
+        is kept as <outputDir>/<cne>.csv, otherwise the rows are merged on
+        their timestamp column onto stdout under one header, with a leading
+        cne column.
+        """
+        # the requests are built here, the streams are only read on the workers
+        dataGens = [getDataGen({'cne': cne}) for cne in cnes]
+        if outputDir is not None:
+            os.makedirs(outputDir, exist_ok=True)
+            spools = [open(os.path.join(outputDir, cne.replace(os.sep, '_') + '.csv'), 'wb') for cne in cnes]
+        else:
+            spools = [tempfile.TemporaryFile() for _ in cnes]
+        try:
+            self.spool_streams(dataGens, spools, workers)
+            if outputDir is None:
+                self.mergeCsvSpools(list(zip(cnes, spools)), sys.stdout)
+        finally:
+            for f in spools:
+                f.close()
+
+    def mergeCsvSpools(self, spools, output):
+        """Write the rows of (cne, file) CSV spools to output, merged on their timestamp column"""
+        header = None
+        readers = []
+        for cne, spool in spools:
+            spool.seek(0)
+            reader = csv.reader(io.TextIOWrapper(spool, encoding='utf-8', newline=''))
+            cneHeader = next(reader, None)
+            if cneHeader is None:
+                continue
+            if header is None:
+                header = cneHeader
+            elif cneHeader != header:
+                raise Exception("CSV header from %s differs: %s" % (cne, cneHeader))
+            readers.append((cne, reader))
+        if header is None:
+            return
+        column = csvTimestampColumn(header)
+
+        def keyed(cne, reader):
+            # a row without a timestamp takes the one of the row before it,
+            # so it stays where it was in its CNE's rows
+            last = -math.inf
+            for row in reader:
+                ts = None
+                if column is not None and len(row) > column:
+                    ts = parseCsvTimestamp(row[column])
+                if ts is not None:
+                    last = ts
+                yield (last, cne, row)
+
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow(['cne'] + header)
+        for _, cne, row in heapq.merge(*[keyed(cne, reader) for cne, reader in readers], key=lambda r: r[0]):
+            writer.writerow([cne] + row)
+
     def get_gap_csv(self, mpReq, startTime, endTime, baseParams, cliFilterObject, output=None):
         params={}
         if output:
@@ -735,7 +2919,13 @@ class MtomTool(CorvilApiMtomClient):
         return dataGen
 
     def run(self, args):
-        opts, args = getopt.gnu_getopt(args, "n:p:x:q:awsbcCzrl:m:t:g:T:f:L:d:F:")
+        opts, args = getopt.gnu_getopt(args, "n:p:x:q:awsbcCzrl:m:t:g:T:f:L:d:F:",
+                                       ["parallel=", "output=", "resume", "all-cnes", "workers=", "output-dir=",
+                                        "batch=", "index=", "compress=",
+                                        "prefetch=", "preallocate",
+                                        "split=", "max-open-files=",
+                                        "gap-stats", "gap-keys=", "gap-column=",
+                                        "rollup=", "group-by=", "sum=", "stats"])
         password = 'admin'
         userName = 'admin'
         bidir = False
@@ -753,6 +2943,27 @@ class MtomTool(CorvilApiMtomClient):
         timeout = 3600
         snaplength = None
         output = "uncompressed"
+        parallel = 1
+        outputFile = None
+        resume = False
+        allCnes = False
+        workers = 4
+        outputDir = None
+        batchFile = None
+        indexInterval = None
+        compression = None
+        compressionLevel = None
+        prefetch = 0
+        preallocate = False
+        split = None
+        maxOpenFiles = PcapSplitter.MAX_OPEN_FILES
+        gapStats = False
+        gapKeys = None
+        gapColumn = None
+        rollup = None
+        groupBy = None
+        sumColumns = None
+        showStats = False
 
         filterObj = {
             "filterType":None,
@@ -804,6 +3015,46 @@ class MtomTool(CorvilApiMtomClient):
                 filterObj["delimiter"] = arg
             elif opt == '-F':
                 output = arg
+            elif opt == '--parallel':
+                parallel = arg
+            elif opt == '--output':
+                outputFile = arg
+            elif opt == '--resume':
+                resume = True
+            elif opt == '--all-cnes':
+                allCnes = True
+            elif opt == '--workers':
+                workers = arg
+            elif opt == '--output-dir':
+                outputDir = arg
+            elif opt == '--batch':
+                batchFile = arg
+            elif opt == '--index':
+                indexInterval = arg
+            elif opt == '--compress':
+                compression, _, compressionLevel = arg.partition(':')
+            elif opt == '--prefetch':
+                prefetch = arg
+            elif opt == '--preallocate':
+                preallocate = True
+            elif opt == '--split':
+                split = arg
+            elif opt == '--max-open-files':
+                maxOpenFiles = arg
+            elif opt == '--gap-stats':
+                gapStats = True
+            elif opt == '--gap-keys':
+                gapKeys = [name for name in arg.split(',') if name.strip()]
+            elif opt == '--gap-column':
+                gapColumn = arg
+            elif opt == '--rollup':
+                rollup = arg
+            elif opt == '--group-by':
+                groupBy = [name.strip() for name in arg.split(',') if name.strip()]
+            elif opt == '--sum':
+                sumColumns = [name.strip() for name in arg.split(',') if name.strip()]
+            elif opt == '--stats':
+                showStats = True
 
         if len(args) == 1 and args[0] == 'version':
             self.version()
@@ -822,11 +3073,141 @@ class MtomTool(CorvilApiMtomClient):
         if (timeout <= 0):
             self.help("Timeout has to be a positive number.\n")
 
+        try:
+            parallel = int(parallel)
+        except ValueError:
+            self.help("Invalid --parallel value.\n")
+
+        if parallel <= 0:
+            self.help("--parallel has to be a positive number.\n")
+        if parallel > 1 and cmd not in ['pcap', 'flow-index']:
+            self.help("--parallel is only supported for pcap and flow-index.\n")
+
+        if output == "parquet":
+            if cmd not in ['message-csv', 'packet-csv', 'flow-index']:
+                self.help("-F parquet is only supported for message-csv, packet-csv and flow-index.\n")
+            if outputFile is None or resume or allCnes:
+                self.help("-F parquet needs --output, and cannot be combined with --resume or --all-cnes.\n")
+        elif outputFile is not None and cmd not in ['pcap', 'message-csv', 'packet-csv']:
+            self.help("--output is only supported for pcap, message-csv and packet-csv.\n")
+        if preallocate and (outputFile is None or output == "parquet"):
+            self.help("--preallocate needs --output, and cannot be combined with -F parquet.\n")
+        if resume and outputFile is None:
+            self.help("--resume needs --output.\n")
+        if resume and parallel > 1:
+            self.help("--resume cannot be combined with --parallel.\n")
+        if outputFile is not None and output not in ["uncompressed", "parquet"] and parallel == 1:
+            self.help("--output needs uncompressed output.\n")
+
+        try:
+            workers = int(workers)
+        except ValueError:
+            self.help("Invalid --workers value.\n")
+
+        if workers <= 0:
+            self.help("--workers has to be a positive number.\n")
+
+        if allCnes:
+            if cmd not in ['gap-csv', 'message-csv', 'packet-csv']:
+                self.help("--all-cnes is only supported for gap-csv, message-csv and packet-csv.\n")
+            if cne is not None or outputFile is not None or output != "uncompressed":
+                self.help("--all-cnes cannot be combined with -x, --output or compressed output.\n")
+        elif split is not None:
+            if split not in PcapSplitter.MODES:
+                self.help("--split should be one of [%s].\n" % "|".join(PcapSplitter.MODES))
+            if cmd != 'pcap' or outputDir is None:
+                self.help("--split is only supported for pcap, and needs --output-dir.\n")
+            if outputFile is not None or output != "uncompressed" or compression is not None:
+                self.help("--split cannot be combined with --output or compressed output.\n")
+            try:
+                maxOpenFiles = int(maxOpenFiles)
+            except ValueError:
+                self.help("Invalid --max-open-files value.\n")
+            if maxOpenFiles <= 0:
+                self.help("--max-open-files has to be a positive number.\n")
+        elif outputDir is not None:
+            self.help("--output-dir needs --all-cnes or --split.\n")
+
+        if indexInterval is not None:
+            try:
+                indexInterval = int(indexInterval)
+            except ValueError:
+                self.help("Invalid --index value.\n")
+            if indexInterval <= 0:
+                self.help("--index has to be a positive number.\n")
+            if cmd != 'pcap' or outputFile is None or output != "uncompressed":
+                self.help("--index is only supported for pcap with --output and uncompressed output.\n")
+
+        try:
+            prefetch = int(prefetch)
+        except ValueError:
+            self.help("Invalid --prefetch value.\n")
+
+        if prefetch < 0:
+            self.help("--prefetch cannot be negative.\n")
+
+        if compression is not None:
+            if compressionLevel:
+                try:
+                    compressionLevel = int(compressionLevel)
+                except ValueError:
+                    self.help("Invalid --compress level.\n")
+            else:
+                compressionLevel = None
+            if compression not in ThreadedSink.COMPRESSION_LEVELS:
+                self.help("--compress should be one of [%s].\n" % "|".join(ThreadedSink.COMPRESSION_LEVELS))
+            try:
+                createCompressor(compression, compressionLevel)
+            except Exception as e:
+                self.help("--compress: %s\n" % e)
+            if cmd in ['mp-list', 'clock-tracking']:
+                self.help("--compress is not supported for %s.\n" % cmd)
+            if output != "uncompressed" or outputFile is not None or allCnes or batchFile is not None:
+                self.help("--compress needs uncompressed output, and cannot be combined with --output, "
+                          "--all-cnes or --batch.\n")
+
+        if gapStats:
+            if cmd != 'gap-csv':
+                self.help("--gap-stats is only supported for gap-csv.\n")
+            if outputFile is not None or allCnes or output != "uncompressed" or compression is not None:
+                self.help("--gap-stats cannot be combined with --output, --all-cnes or compressed output.\n")
+        elif gapKeys is not None or gapColumn is not None:
+            self.help("--gap-keys and --gap-column need --gap-stats.\n")
+
+        if rollup is not None or groupBy is not None or sumColumns is not None:
+            if cmd != 'flow-index':
+                self.help("--rollup, --group-by and --sum are only supported for flow-index.\n")
+            if rollup is not None:
+                try:
+                    rollup = parseDuration(rollup)
+                except ValueError:
+                    self.help("Invalid --rollup value.\n")
+                if rollup <= 0:
+                    self.help("--rollup has to be a positive duration.\n")
+            if output != "uncompressed" or compression is not None:
+                self.help("--rollup, --group-by and --sum need uncompressed output.\n")
+        elif parallel > 1 and cmd == 'flow-index':
+            self.help("--parallel for flow-index needs --rollup or --group-by.\n")
+
+        if batchFile is not None:
+            if cmd != 'multihop-csv':
+                self.help("--batch is only supported for multihop-csv.\n")
+            if outputFile is not None or allCnes or output != "uncompressed":
+                self.help("--batch cannot be combined with --output, --all-cnes or compressed output.\n")
+
         host, port = self.parseHost(args[1])
         self.client = CorvilApiMtomClient(host, port=port,
-            password = password, username=userName,cne=cne, useHttps=useHttps, timeout=timeout)
+            password = password, username=userName,cne=cne, useHttps=useHttps, timeout=timeout,
+            zeroCopy=True, prefetchBlocks=prefetch)
+        if prefetch:
+            atexit.register(self.report_prefetch)
+        if showStats:
+            atexit.register(self.report_stats)
+
+        if allCnes and not self.client.hostIsLmc:
+            self.help("--all-cnes needs a CMC host.\n")
 
-        if self.client.hostIsLmc and cmd != "lens-csv" and cne is None:
+        if self.client.hostIsLmc and cmd != "lens-csv" and cne is None and not allCnes:
             self.help()
 
         if self.client.hostIsLmc and cne is not None:
@@ -836,7 +3217,8 @@ class MtomTool(CorvilApiMtomClient):
 
         output_opts = {"uncompressed":None,
                            "zip":"zip",
-                           "gzip":"gzip"}
+                           "gzip":"gzip",
+                           "parquet":None}
         compressed_options = ["zip", "gzip"]
         if output not in output_opts:
             sys.stderr.write("'%s' is not a valid option for the output format -F, should be one of [%s]\n" %
@@ -857,8 +3239,7 @@ class MtomTool(CorvilApiMtomClient):
             if len(args) == 4:
                 view = args[3]
             dataGen = self.get_lens_csv(period, view, output_opts[output])
-            for block in dataGen:
-                sys.stdout.buffer.write(block)
+            self.write_blocks(dataGen, sys.stdout.buffer, compression, compressionLevel)
             sys.exit(0)
 
         elif cmd == 'flow-index':
@@ -871,12 +3252,30 @@ class MtomTool(CorvilApiMtomClient):
                 aggr = args[4].split(",")
                 if len(aggr) == 0:
                     self.help()
+            if rollup is not None or groupBy is not None or sumColumns is not None:
+                self.flow_rollup(lambda fromNs, toNs: self.get_flow_index(fromNs, toNs, aggr, watchlistMetadata,
+                                     showMeasurementPoints, query, summariesOnly, baseParams),
+                                 startTime, endTime, parallel, sys.stdout, rollup, groupBy or [], sumColumns)
+                sys.exit(0)
             dataGen = self.get_flow_index(startTime, endTime, aggr, watchlistMetadata, showMeasurementPoints,
                                           query, summariesOnly, baseParams, output_opts[output])
-            for block in dataGen:
-                sys.stdout.buffer.write(block)
+            if output == "parquet":
+                self.write_parquet(dataGen, outputFile)
+                sys.exit(0)
+            self.write_blocks(dataGen, sys.stdout.buffer, compression, compressionLevel)
             sys.exit(0)
 
+        elif cmd == 'multihop-csv' and batchFile is not None:
+            if len(args) != 3:
+                self.help()
+            mpReq = args[2]
+            if batchFile == '-':
+                failures = self.get_multihop_csv_batch(csv.reader(sys.stdin), mpReq, baseParams, workers, sys.stdout)
+            else:
+                with open(batchFile, newline='') as f:
+                    failures = self.get_multihop_csv_batch(csv.reader(f), mpReq, baseParams, workers, sys.stdout)
+            sys.exit(1 if failures else 0)
+
         elif cmd == 'multihop-csv':
             if len(args) < 6:
                 self.help()
@@ -885,11 +3284,10 @@ class MtomTool(CorvilApiMtomClient):
             message_index = args[5]
             mpReq = args[2]
             dataGen = self.get_multihop_csv(timestamp, message_id, message_index, mpReq, baseParams, output_opts[output])
-            for block in dataGen:
-                if output in compressed_options:
-                    sys.stdout.buffer.write(block)
-                else:
-                    sys.stdout.write(block.decode())
+            if output in compressed_options or compression is not None:
+                self.write_blocks(dataGen, sys.stdout.buffer, compression, compressionLevel)
+            else:
+                self.write_text(dataGen)
             sys.exit(0)
 
         elif cmd == 'pcap':
@@ -909,7 +3307,7 @@ class MtomTool(CorvilApiMtomClient):
             endTime = args[4]
             #Relocate this check here to allow the get_pcap call to be made unimpeded by
             #other users of the sample client API
-            if os.isatty(sys.stdout.fileno()):
+            if outputFile is None and split is None and os.isatty(sys.stdout.fileno()):
                 sys.stderr.write("Not sending binary pcap data to STDOUT\n")
                 sys.exit(1)
 
@@ -918,9 +3316,39 @@ class MtomTool(CorvilApiMtomClient):
                                 (output, "|".join(output_opts.keys())))
                 sys.exit(1)
 
-            dataGen = self.get_pcap(bidir, baseParams, mpReq, startTime, endTime, filterObj, extraMps, snaplength, output_opts[output])
-            for block in dataGen:
-                sys.stdout.buffer.write(block)
+            if parallel > 1:
+                if output != "uncompressed":
+                    self.help("--parallel needs uncompressed pcap output.\n")
+                dataGen = self.get_pcap_parallel(parallel, bidir, baseParams, mpReq, startTime, endTime, filterObj,
+                                                 extraMps, snaplength)
+                if outputFile is not None:
+                    indexer = PcapIndexBuilder(indexInterval) if indexInterval else None
+                    with self.open_output(outputFile, 0, preallocate) as f:
+                        sink = ThreadedSink(f)
+                        try:
+                            for block in dataGen:
+                                sink.write(block)
+                                if indexer is not None:
+                                    indexer.feed(block)
+                        finally:
+                            sink.close()
+                    if indexer is not None:
+                        indexer.write(outputFile + INDEX_SUFFIX)
+                    sys.exit(0)
+            elif outputFile is not None:
+                request = self.download_request(cmd, mpReq, startTime, endTime, baseParams, filterObj,
+                                                bidir=bidir, extraMps=extraMps, snaplength=snaplength)
+                self.download_to_file(outputFile, resume, request, PcapCheckpointTracker,
+                    lambda fromNs: self.get_pcap(bidir, baseParams, mpReq, fromNs or startTime, endTime, filterObj,
+                                                 extraMps, snaplength),
+                    PcapIndexBuilder(indexInterval) if indexInterval else None, preallocate)
+                sys.exit(0)
+            else:
+                dataGen = self.get_pcap(bidir, baseParams, mpReq, startTime, endTime, filterObj, extraMps, snaplength, output_opts[output])
+            if split is not None:
+                self.split_pcap(dataGen, outputDir, split, maxOpenFiles)
+                sys.exit(0)
+            self.write_blocks(dataGen, sys.stdout.buffer, compression, compressionLevel)
             sys.exit(0)
 
         elif cmd == 'gap-csv':
@@ -929,12 +3357,20 @@ class MtomTool(CorvilApiMtomClient):
             mpReq = args[2]
             startTime = args[3]
             endTime = args[4]
+            if allCnes:
+                self.fan_out(self.cnes_with_mp(mpReq), workers,
+                    lambda cneParams: self.get_gap_csv(mpReq, startTime, endTime, cneParams, filterObj),
+                    outputDir)
+                sys.exit(0)
+            if gapStats:
+                self.gap_stats(self.get_gap_csv(mpReq, startTime, endTime, baseParams, filterObj),
+                               sys.stdout, gapKeys, gapColumn)
+                sys.exit(0)
             dataGen = self.get_gap_csv(mpReq, startTime, endTime, baseParams, filterObj, output_opts[output])
-            for block in dataGen:
-                if output in compressed_options:
-                    sys.stdout.buffer.write(block)
-                else:
-                    sys.stdout.write(block.decode())
+            if output in compressed_options or compression is not None:
+                self.write_blocks(dataGen, sys.stdout.buffer, compression, compressionLevel)
+            else:
+                self.write_text(dataGen)
             sys.exit(0)
 
         elif cmd == 'message-csv':
@@ -943,13 +3379,31 @@ class MtomTool(CorvilApiMtomClient):
             mpReq = args[2]
             startTime = args[3]
             endTime = args[4]
+            if allCnes:
+                self.fan_out(self.cnes_with_mp(mpReq), workers,
+                    lambda cneParams: self.get_message_csv(bidir, includeCA, includeCI, columns, cneParams, mpReq,
+                                                           startTime, endTime, filterObj),
+                    outputDir)
+                sys.exit(0)
+            if output == "parquet":
+                self.write_parquet(self.get_message_csv(bidir, includeCA, includeCI, columns, baseParams, mpReq,
+                                                        startTime, endTime, filterObj), outputFile)
+                sys.exit(0)
+            if outputFile is not None:
+                request = self.download_request(cmd, mpReq, startTime, endTime, baseParams, filterObj,
+                                                bidir=bidir, withCorrelation=includeCA,
+                                                withCorrelationIds=includeCI, columns=columns)
+                self.download_to_file(outputFile, resume, request, CsvCheckpointTracker,
+                    lambda fromNs: self.get_message_csv(bidir, includeCA, includeCI, columns, baseParams, mpReq,
+                                                        fromNs or startTime, endTime, filterObj),
+                    preallocate=preallocate)
+                sys.exit(0)
             dataGen = self.get_message_csv( bidir, includeCA, includeCI, columns, baseParams, mpReq, startTime, endTime,
                                             filterObj, output_opts[output])
-            for block in dataGen:
-                if output in compressed_options:
-                    sys.stdout.buffer.write(block)
-                else:
-                    sys.stdout.write(block.decode())
+            if output in compressed_options or compression is not None:
+                self.write_blocks(dataGen, sys.stdout.buffer, compression, compressionLevel)
+            else:
+                self.write_text(dataGen)
             sys.exit(0)
 
         elif cmd == 'packet-csv':
@@ -958,13 +3412,30 @@ class MtomTool(CorvilApiMtomClient):
             mpReq = args[2]
             startTime = args[3]
             endTime = args[4]
+            if allCnes:
+                self.fan_out(self.cnes_with_mp(mpReq), workers,
+                    lambda cneParams: self.get_packet_csv(bidir, columns, cneParams, mpReq, startTime, endTime,
+                                                          filterObj),
+                    outputDir)
+                sys.exit(0)
+            if output == "parquet":
+                self.write_parquet(self.get_packet_csv(bidir, columns, baseParams, mpReq, startTime, endTime,
+                                                       filterObj), outputFile)
+                sys.exit(0)
+            if outputFile is not None:
+                request = self.download_request(cmd, mpReq, startTime, endTime, baseParams, filterObj,
+                                                bidir=bidir, columns=columns)
+                self.download_to_file(outputFile, resume, request, CsvCheckpointTracker,
+                    lambda fromNs: self.get_packet_csv(bidir, columns, baseParams, mpReq, fromNs or startTime,
+                                                       endTime, filterObj),
+                    preallocate=preallocate)
+                sys.exit(0)
             dataGen = self.get_packet_csv(bidir, columns, baseParams, mpReq, startTime, endTime, filterObj,
                                           output_opts[output])
-            for block in dataGen:
-                if output in compressed_options:
-                    sys.stdout.buffer.write(block)
-                else:
-                    sys.stdout.write(block.decode())
+            if output in compressed_options or compression is not None:
+                self.write_blocks(dataGen, sys.stdout.buffer, compression, compressionLevel)
+            else:
+                self.write_text(dataGen)
             sys.exit(0)
 
         elif cmd == 'clock-tracking':
@@ -977,8 +3448,7 @@ class MtomTool(CorvilApiMtomClient):
             mp = "channel//%s///ClockTracking" % (localCne)
             dataGen = self.get_message_csv( False, False, False, None, baseParams, mp, startTime, endTime, None)
             print('#client version: %s' % (VERSION,), flush = True)
-            for block in dataGen:
-                sys.stdout.write(block.decode())
+            self.write_text(dataGen)
             sys.exit(0)
 
 
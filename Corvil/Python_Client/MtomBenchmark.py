@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+# NB: this was developed against Python v3.6
+
+"""
+Throughput benchmark for the MTOM data phase of CorvilApiStreamingClient
+
+Usage: MtomBenchmark.py [<size_mb>] [<repeats>]
+
+Streams an in-memory MTOM response of <size_mb> MiB (default 512) through
+the original byte-at-a-time header and bytes-concatenating data loops and
+through MtomResponseReader, and prints the bytes/sec of each. No CNE
+is needed: the response is served from memory, so the figures are the CPU
+cost of the client loop alone, i.e. the ceiling it puts on network
+throughput.
+"""
+
+import errno
+import io
+import os
+import socket
+import sys
+import time
+
+from CorvilApiStreamingClient import CorvilApiMtomClient, MtomResponseReader
+
+UUID = b'uuid:00000000-0000-0000-0000-000000000000'
+
+
+def buildResponse(sizeMb):
+    """Build an MTOM body carrying sizeMb MiB of attachment data"""
+    chunk = os.urandom(1024 * 1024)
+    parts = [UUID, b'\r\nContent-Type: application/xop+xml\r\n\r\n',
+             b'<getPcapResponse/>\r\n', UUID,
+             b'\r\nContent-Type: application/octet-stream\r\n\r\n']
+    parts.extend([chunk] * sizeMb)
+    parts.extend([b'\r\n', UUID, b'--'])
+    return b''.join(parts)
+
+
+def readHeaders(reader):
+    """Skip the UUID, XML and part headers, returning the end marker"""
+    uuid = reader.getLine(CorvilApiMtomClient.MAX_XML_SIZE)
+    while reader.getLine(CorvilApiMtomClient.MAX_XML_SIZE) != uuid:
+        pass
+    while reader.getLine(CorvilApiMtomClient.MAX_XML_SIZE) != b'':
+        pass
+    return b'\r\n%s--' % uuid
+
+
+def readSock(sock, nbytes):
+    """Handle EINTR in read, as the client did before MtomResponseReader"""
+    while True:
+        try:
+            data = sock.read(nbytes)
+        except socket.error as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+        return data
+
+
+def legacyGetLine(resp, maxlen=CorvilApiMtomClient.MAX_XML_SIZE):
+    """Read a line character by character, as the client did before MtomResponseReader"""
+    line = b''
+    while len(line) < maxlen and (len(line) < 2 or line[-2:] != b'\r\n'):
+        c = readSock(resp, 1)
+        if not c:
+            raise Exception("getLine failed line=`%s'" % line.decode("utf-8").strip())
+        line += c
+    return line[:-2]
+
+
+def legacyDataBlocks(resp):
+    """The header and data loops as they were before MtomResponseReader, for comparison"""
+    uuid = legacyGetLine(resp)
+    while legacyGetLine(resp) != uuid:
+        pass
+    while legacyGetLine(resp) != b'':
+        pass
+
+    endMarker = b'\r\n%s--' % uuid
+    dat = b''
+    while True:
+        newDat = readSock(resp, CorvilApiMtomClient.READ_BLOCK_SIZE)
+        if not newDat or len(dat) + len(newDat) < len(endMarker):
+            raise Exception("Missing end marker")
+        dat += newDat
+        if len(dat) > len(endMarker):
+             yield dat[:-len(endMarker)]
+        dat = dat[-len(endMarker):]
+        if dat == endMarker:
+            break
+
+
+def readerDataBlocks(resp):
+    """The header and data loops of MtomResponseReader"""
+    reader = MtomResponseReader(resp)
+    endMarker = readHeaders(reader)
+    return reader.getDataBlocks(endMarker, CorvilApiMtomClient.READ_BLOCK_SIZE)
+
+
+def run(body, loop):
+    resp = io.BufferedReader(io.BytesIO(body))
+    total = 0
+    start = time.perf_counter()
+    for block in loop(resp):
+        total += len(block)
+    return total, time.perf_counter() - start
+
+
+def main(args):
+    sizeMb = int(args[0]) if len(args) > 0 else 512
+    repeats = int(args[1]) if len(args) > 1 else 3
+    body = buildResponse(sizeMb)
+
+    loops = [("bytes concat", legacyDataBlocks),
+             ("bytearray/readinto", readerDataBlocks)]
+    for name, loop in loops:
+        best = None
+        for _ in range(repeats):
+            total, elapsed = run(body, loop)
+            if total != sizeMb * 1024 * 1024:
+                sys.stderr.write("%s: got %d bytes, expected %d\n" % (name, total, sizeMb * 1024 * 1024))
+                return 1
+            if best is None or elapsed < best:
+                best = elapsed
+        print("%-20s %10.1f MB/s  (%d MiB in %.3fs)" % (name, total / best / 1e6, sizeMb, best))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
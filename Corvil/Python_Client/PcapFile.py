@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+
+# NB: this was developed against Python v3.6
+
+"""
+Helpers for the classic libpcap file format as returned by the getPcap
+MTOM export: global header parsing, record iteration over a file, a
+scanner that follows record boundaries through a stream of blocks, a
+sidecar time index for seeking to a time window of a pcap file, and a
+splitter of a pcap stream into per-flow or per-VLAN files.
+"""
+
+import array
+import bisect
+import collections
+import ipaddress
+import os
+import struct
+import sys
+
+GLOBAL_HEADER_LEN = 24
+RECORD_HEADER_LEN = 16
+
+MAGIC_MICROSECONDS = 0xa1b2c3d4
+MAGIC_NANOSECONDS = 0xa1b23c4d
+
+INDEX_SUFFIX = '.idx'
+INDEX_MAGIC = b'PCAPIDX1'
+# magic, interval, ordered flag, record count, indexed pcap size
+INDEX_HEADER = struct.Struct('<8sIIqq')
+DEFAULT_INDEX_INTERVAL = 1000
+
+LINKTYPE_ETHERNET = 1
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86dd
+VLAN_ETHERTYPES = (0x8100, 0x88a8, 0x9100)
+IPV6_EXTENSION_HEADERS = (0, 43, 60)
+IPV6_FRAGMENT_HEADER = 44
+IP_PROTOCOL_NAMES = {6: 'tcp', 17: 'udp'}
+PORTS = struct.Struct('>HH')
+
+
+class PcapFormatError(Exception):
+    pass
+
+
+class PcapGlobalHeader(object):
+    """The 24 byte pcap global header"""
+    def __init__(self, raw):
+        if len(raw) < GLOBAL_HEADER_LEN:
+            raise PcapFormatError("truncated pcap global header")
+        for endian in ('<', '>'):
+            magic = struct.unpack_from(endian + 'I', raw)[0]
+            if magic in (MAGIC_MICROSECONDS, MAGIC_NANOSECONDS):
+                break
+        else:
+            raise PcapFormatError("not a classic pcap stream (magic %s)" %
+                                  bytes(raw[:4]).hex())
+        self.raw = bytes(raw[:GLOBAL_HEADER_LEN])
+        self.endian = endian
+        self.nsResolution = (magic == MAGIC_NANOSECONDS)
+        (_, self.versionMajor, self.versionMinor, _, _,
+         self.snaplen, self.linktype) = struct.unpack_from(endian + 'IHHiIII', raw)
+        self.recordHeader = struct.Struct(endian + 'IIII')
+
+    def timestampNs(self, seconds, fraction):
+        """Convert a record header timestamp to epoch nanoseconds"""
+        if self.nsResolution:
+            return seconds * 1000000000 + fraction
+        return seconds * 1000000000 + fraction * 1000
+
+
+def readGlobalHeader(f):
+    """Read the global header from the start of a pcap file, None if empty"""
+    raw = f.read(GLOBAL_HEADER_LEN)
+    if not raw:
+        return None
+    return PcapGlobalHeader(raw)
+
+
+def readRecords(f, header):
+    """
+    Yield (timestampNs, record) for each record from the current position of
+    f, where record is the raw record header plus packet data.
+    """
+    unpack = header.recordHeader.unpack
+    while True:
+        recordHeader = f.read(RECORD_HEADER_LEN)
+        if len(recordHeader) < RECORD_HEADER_LEN:
+            if recordHeader:
+                raise PcapFormatError("truncated pcap record header")
+            return
+        seconds, fraction, inclLen, _ = unpack(recordHeader)
+        data = f.read(inclLen)
+        if len(data) < inclLen:
+            raise PcapFormatError("truncated pcap record")
+        yield (header.timestampNs(seconds, fraction), recordHeader + data)
+
+
+class PcapStreamScanner(object):
+    """
+    Follows pcap record boundaries through a stream of blocks, such as the
+    ones yielded by getPcapInBlocks, without copying the packet data. Only a
+    record header that straddles two blocks is buffered.
+
+    record() is called with the stream offset, timestamp and length of each
+    record header as it is seen; subclasses extend it to index or checkpoint
+    the stream. The base implementation keeps the record count, the first
+    and last timestamps, and the offsets of the trailing records that share
+    the last timestamp.
+    """
+    def __init__(self):
+        self.header = None
+        self.offset = 0
+        self.nextRecord = GLOBAL_HEADER_LEN
+        self.pending = bytearray()
+        self.records = 0
+        self.firstTs = None
+        self.lastTs = None
+        self.lastTsOffsets = []
+        self.ordered = True
+
+    def feed(self, block):
+        view = memoryview(block)
+        size = len(view)
+        base = self.offset
+        self.offset += size
+        if self.header is None:
+            need = GLOBAL_HEADER_LEN - len(self.pending)
+            self.pending += view[:need]
+            if len(self.pending) < GLOBAL_HEADER_LEN:
+                return
+            self.header = PcapGlobalHeader(self.pending)
+            self.pending = bytearray()
+        if self.pending:
+            # finish a record header that started in the previous block
+            need = RECORD_HEADER_LEN - len(self.pending)
+            self.pending += view[:need]
+            if len(self.pending) < RECORD_HEADER_LEN:
+                return
+            self.nextRecord += self._recordHeader(self.nextRecord, self.pending, 0)
+            self.pending = bytearray()
+        pos = self.nextRecord - base
+        while pos + RECORD_HEADER_LEN <= size:
+            pos += self._recordHeader(base + pos, view, pos)
+        self.nextRecord = base + pos
+        if pos < size:
+            self.pending += view[pos:]
+
+    def _recordHeader(self, offset, buf, pos):
+        seconds, fraction, inclLen, _ = self.header.recordHeader.unpack_from(buf, pos)
+        length = RECORD_HEADER_LEN + inclLen
+        self.record(offset, self.header.timestampNs(seconds, fraction), length)
+        return length
+
+    def record(self, offset, timestampNs, length):
+        self.records += 1
+        if self.firstTs is None:
+            self.firstTs = timestampNs
+        if timestampNs == self.lastTs:
+            self.lastTsOffsets.append(offset)
+            return
+        if self.lastTs is not None and timestampNs < self.lastTs:
+            self.ordered = False
+        self.lastTs = timestampNs
+        self.lastTsOffsets = [offset]
+
+    def isComplete(self):
+        """True if the stream so far ends exactly on a record boundary"""
+        return self.header is not None and self.nextRecord == self.offset
+
+
+class PcapIndexBuilder(PcapStreamScanner):
+    """
+    Builds the sidecar time index of a pcap stream as it is written: every
+    interval'th record's file offset, along with the latest timestamp of
+    the records before it. Seeking to the last entry whose latest
+    timestamp is before a window start is then safe even if the records
+    are not in time order.
+
+    The index file is INDEX_HEADER followed by the entries as little endian
+    int64 (latestTimestampNsBefore, offset) pairs.
+    """
+    def __init__(self, interval=DEFAULT_INDEX_INTERVAL):
+        PcapStreamScanner.__init__(self)
+        self.interval = interval
+        self.maxTs = -1
+        self.entries = array.array('q')
+
+    def feedFile(self, f, size, blockSize=1024 * 1024):
+        """Scan the first size bytes of f, e.g. when appending to a resumed download"""
+        f.seek(0)
+        while size > 0:
+            block = f.read(min(blockSize, size))
+            if not block:
+                raise PcapFormatError("pcap file is shorter than %d bytes" % size)
+            self.feed(block)
+            size -= len(block)
+
+    def record(self, offset, timestampNs, length):
+        if self.records % self.interval == 0:
+            self.entries.append(self.maxTs)
+            self.entries.append(offset)
+        PcapStreamScanner.record(self, offset, timestampNs, length)
+        if timestampNs > self.maxTs:
+            self.maxTs = timestampNs
+
+    def write(self, path):
+        """Write the index of the stream scanned so far to path"""
+        if not self.isComplete():
+            raise PcapFormatError("cannot index a pcap that ends part way through a record")
+        entries = self.entries
+        if sys.byteorder != 'little':
+            entries = array.array('q', entries)
+            entries.byteswap()
+        with open(path, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, self.interval, int(self.ordered),
+                                      self.records, self.offset))
+            entries.tofile(f)
+
+
+class PcapIndex(object):
+    """A sidecar time index as written by PcapIndexBuilder"""
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            raw = f.read(INDEX_HEADER.size)
+            if len(raw) < INDEX_HEADER.size:
+                raise PcapFormatError("truncated pcap index %s" % path)
+            magic, self.interval, ordered, self.records, self.size = INDEX_HEADER.unpack(raw)
+            if magic != INDEX_MAGIC:
+                raise PcapFormatError("%s is not a pcap index" % path)
+            self.ordered = bool(ordered)
+            entries = array.array('q', f.read())
+        if sys.byteorder != 'little':
+            entries.byteswap()
+        self.maxTsBefore = entries[0::2]
+        self.offsets = entries[1::2]
+
+    def seekOffset(self, startNs):
+        """
+        The file offset of the indexed record from which all the records at
+        or after startNs are found
+        """
+        i = bisect.bisect_left(self.maxTsBefore, startNs)
+        if i == 0:
+            return GLOBAL_HEADER_LEN
+        return self.offsets[i - 1]
+
+
+class PcapIndexedReader(object):
+    """
+    Reads time windows of a pcap file, seeking with its sidecar index when
+    there is one that matches the file. Without a usable index the file is
+    scanned from the start.
+
+        with PcapIndexedReader("capture.pcap") as reader:
+            for timestampNs, record in reader.records(startNs, endNs):
+                ...
+    """
+    def __init__(self, path, indexPath=None):
+        self.f = open(path, 'rb')
+        try:
+            self.header = readGlobalHeader(self.f)
+            if self.header is None:
+                raise PcapFormatError("%s is empty" % path)
+            self.index = None
+            try:
+                index = PcapIndex(indexPath or path + INDEX_SUFFIX)
+            except (IOError, OSError):
+                index = None
+            size = self.f.seek(0, 2)
+            # an index for a different version of the file is ignored
+            if index is not None and index.size == size:
+                self.index = index
+        except BaseException:
+            self.f.close()
+            raise
+
+    def records(self, startNs, endNs):
+        """Yield (timestampNs, record) for the records with startNs <= timestamp < endNs"""
+        if self.index is not None:
+            self.f.seek(self.index.seekOffset(startNs))
+            ordered = self.index.ordered
+        else:
+            self.f.seek(GLOBAL_HEADER_LEN)
+            ordered = False
+        for timestampNs, record in readRecords(self.f, self.header):
+            if timestampNs >= endNs:
+                if ordered:
+                    return
+            elif timestampNs >= startNs:
+                yield (timestampNs, record)
+
+    def writeWindow(self, output, startNs, endNs):
+        """Write the records of a time window to output as a pcap, returning the record count"""
+        output.write(self.header.raw)
+        count = 0
+        for _, record in self.records(startNs, endNs):
+            output.write(record)
+            count += 1
+        return count
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def parseEthernet(packet):
+    """
+    Return (outermost VLAN ID or None, ethertype, payload offset) of an
+    Ethernet frame, or None if it is truncated
+    """
+    if len(packet) < 14:
+        return None
+    vlan = None
+    ethertype = (packet[12] << 8) | packet[13]
+    pos = 14
+    while ethertype in VLAN_ETHERTYPES:
+        if len(packet) < pos + 4:
+            return None
+        if vlan is None:
+            vlan = ((packet[pos] << 8) | packet[pos + 1]) & 0x0fff
+        ethertype = (packet[pos + 2] << 8) | packet[pos + 3]
+        pos += 4
+    return (vlan, ethertype, pos)
+
+
+def parseIpFlow(packet, ethertype, pos):
+    """
+    Return (protocol, source address, source port, destination address,
+    destination port) of the IPv4 or IPv6 packet at pos, or None. The
+    ports are 0 for protocols other than TCP and UDP, and for fragments
+    other than the first.
+    """
+    if ethertype == ETHERTYPE_IPV4:
+        if len(packet) < pos + 20:
+            return None
+        protocol = packet[pos + 9]
+        src = bytes(packet[pos + 12:pos + 16])
+        dst = bytes(packet[pos + 16:pos + 20])
+        fragmentOffset = ((packet[pos + 6] << 8) | packet[pos + 7]) & 0x1fff
+        l4 = pos + (packet[pos] & 0x0f) * 4 if fragmentOffset == 0 else None
+    elif ethertype == ETHERTYPE_IPV6:
+        if len(packet) < pos + 40:
+            return None
+        protocol = packet[pos + 6]
+        src = bytes(packet[pos + 8:pos + 24])
+        dst = bytes(packet[pos + 24:pos + 40])
+        l4 = pos + 40
+        while l4 is not None and (protocol in IPV6_EXTENSION_HEADERS or protocol == IPV6_FRAGMENT_HEADER):
+            if len(packet) < l4 + 8:
+                l4 = None
+                break
+            nextProtocol = packet[l4]
+            if protocol == IPV6_FRAGMENT_HEADER:
+                fragmentOffset = ((packet[l4 + 2] << 8) | packet[l4 + 3]) >> 3
+                l4 = l4 + 8 if fragmentOffset == 0 else None
+            else:
+                l4 += (packet[l4 + 1] + 1) * 8
+            protocol = nextProtocol
+    else:
+        return None
+    srcPort = dstPort = 0
+    if l4 is not None and protocol in IP_PROTOCOL_NAMES and len(packet) >= l4 + PORTS.size:
+        srcPort, dstPort = PORTS.unpack_from(packet, l4)
+    return (protocol, src, srcPort, dst, dstPort)
+
+
+class PcapSplitter(PcapStreamScanner):
+    """
+    Splits a pcap stream into one pcap file per flow or per VLAN as it is
+    fed blocks, such as the ones yielded by getPcapInBlocks, so the split
+    takes no second pass over the data. The record boundaries come from
+    PcapStreamScanner; only a record that straddles blocks is buffered.
+
+    In 'flow' mode a flow is the IP protocol and both (address, port)
+    ends of an Ethernet IPv4 or IPv6 packet, in either direction, and
+    other packets go to non-ip.pcap. In 'vlan' mode the outermost VLAN ID
+    is used, and untagged packets go to untagged.pcap. At most
+    maxOpenFiles files are kept open; beyond that the least recently
+    written one is closed, to be reopened for appending if needed.
+    """
+    MODES = ('flow', 'vlan')
+    MAX_OPEN_FILES = 256
+
+    def __init__(self, outputDir, mode='flow', maxOpenFiles=MAX_OPEN_FILES):
+        if mode not in self.MODES:
+            raise ValueError("unknown split mode: %s" % mode)
+        PcapStreamScanner.__init__(self)
+        self.outputDir = outputDir
+        self.fileName = self.flowName if mode == 'flow' else self.vlanName
+        self.maxOpenFiles = maxOpenFiles
+        self.files = collections.OrderedDict()
+        self.created = set()
+        # (offset, length) of the records seen but not yet written
+        self.seen = collections.deque()
+        # the stream from heldStart up to the current block, while a record straddles blocks
+        self.held = bytearray()
+        self.heldStart = 0
+
+    def feed(self, block):
+        view = memoryview(block)
+        base = self.offset
+        PcapStreamScanner.feed(self, view)
+        end = self.offset
+        seen = self.seen
+        while seen and seen[0][0] + seen[0][1] <= end:
+            offset, length = seen.popleft()
+            if offset >= base:
+                self.route(view[offset - base:offset + length - base])
+            else:
+                self.route(self.held[offset - self.heldStart:] + view[:offset + length - base])
+        # keep what is left of the stream from the first record not yet written
+        first = seen[0][0] if seen else min(self.nextRecord, end)
+        if first >= end:
+            self.held = bytearray()
+        elif first >= base:
+            self.held = bytearray(view[first - base:])
+        else:
+            del self.held[:first - self.heldStart]
+            self.held += view
+        self.heldStart = first
+
+    def record(self, offset, timestampNs, length):
+        # records are counted as they are written, by route()
+        self.seen.append((offset, length))
+
+    def route(self, record):
+        name = self.fileName(memoryview(record)[RECORD_HEADER_LEN:])
+        f = self.files.get(name)
+        if f is None:
+            if len(self.files) >= self.maxOpenFiles:
+                _, oldest = self.files.popitem(last=False)
+                oldest.close()
+            path = os.path.join(self.outputDir, name + '.pcap')
+            if name in self.created:
+                f = open(path, 'ab')
+            else:
+                f = open(path, 'wb')
+                f.write(self.header.raw)
+                self.created.add(name)
+            self.files[name] = f
+        else:
+            self.files.move_to_end(name)
+        f.write(record)
+        self.records += 1
+
+    def flowName(self, packet):
+        flow = None
+        if self.header.linktype == LINKTYPE_ETHERNET:
+            ethernet = parseEthernet(packet)
+            if ethernet is not None:
+                flow = parseIpFlow(packet, ethernet[1], ethernet[2])
+        if flow is None:
+            return 'non-ip'
+        protocol, src, srcPort, dst, dstPort = flow
+        ends = sorted([(src, srcPort), (dst, dstPort)])
+        return '%s_%s_%d_%s_%d' % (IP_PROTOCOL_NAMES.get(protocol, 'ip%d' % protocol),
+                                   self.addressName(ends[0][0]), ends[0][1],
+                                   self.addressName(ends[1][0]), ends[1][1])
+
+    def vlanName(self, packet):
+        if self.header.linktype == LINKTYPE_ETHERNET:
+            ethernet = parseEthernet(packet)
+            if ethernet is not None and ethernet[0] is not None:
+                return 'vlan%d' % ethernet[0]
+        return 'untagged'
+
+    @staticmethod
+    def addressName(address):
+        # ':' is not allowed in Windows file names
+        return str(ipaddress.ip_address(address)).replace(':', '-')
+
+    def write(self, block):
+        """feed(), so that a splitter can stand in for an output file"""
+        self.feed(block)
+        return len(block)
+
+    def flush(self):
+        for f in self.files.values():
+            f.flush()
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files.clear()